@@ -0,0 +1,224 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+# Throughput benchmark of the scan engines against local listeners.
+# Every run is a separate process, so its peak memory is its own. Examples :
+#     python benchmarks/bench.py
+#     python benchmarks/bench.py --engines select --concurrency 256 1024 --ports 20000 -o select.json
+
+import argparse
+import errno
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+from time import monotonic, sleep
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","src"))
+
+from listeners import Listeners
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class Sampler:
+    # peak number of threads and open files while the scan runs
+    INTERVAL = 0.01
+
+    def __init__(self) -> None:
+        self.threads = 0
+        self.fds = None
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run,name="RNPS-Bench-Sampler",daemon=True)
+
+    @staticmethod
+    def countFds():
+        for path in ("/proc/self/fd","/dev/fd"):
+            if os.path.isdir(path):
+                return len(os.listdir(path))
+        return None
+
+    def sample(self):
+        self.threads = max(self.threads,threading.active_count())
+        fds = self.countFds()
+        if fds is not None:
+            self.fds = max(self.fds or 0,fds)
+
+    def run(self):
+        while not self.stopping.wait(self.INTERVAL):
+            self.sample()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+        self.sample()
+
+def peakRss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def percentile(values,p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1,int(len(values) * p / 100))]
+
+def classify(code):
+    if code == 0:
+        return "open"
+    if code == errno.ECONNREFUSED:
+        return "closed"
+    if code == errno.EAGAIN:
+        return "filtered"
+    return "other"
+
+def worker(config):
+    from rnps.host import Host
+    from rnps.port import Port
+    from rnps.scan import Scan
+
+    class BenchScan(Scan):
+        def __init__(self,*args,**kwargs) -> None:
+            super().__init__(*args,**kwargs)
+            self.latencies = []
+
+        def observe(self,address,port_type,r,elapsed):
+            self.latencies.append(elapsed)
+            super().observe(address,port_type,r,elapsed)
+
+    scan = BenchScan(host=Host(Listeners.ADDRESS),port=Port(config["ports"],Port.TCP),
+                     engine=config["engine"],maxThreads=config["threads"],concurrency=config["concurrency"],
+                     minTimeout=config["min_timeout"],maxTimeout=config["max_timeout"],
+                     verbose=True,discovery=False)
+    sampler = Sampler()
+    sampler.start()
+    start = monotonic()
+    scan.start()
+    scan.join()
+    elapsed = monotonic() - start
+    sampler.stop()
+
+    result = scan.result()
+    found = {"open":0,"closed":0,"filtered":0,"other":0}
+    mismatches = 0
+    probes = 0
+    for host in result["hosts"].values():
+        for port,code in zip(host.ports,host.codes):
+            state = classify(code)
+            found[state] += 1
+            probes += 1
+            if state != config["expected"][str(port)]:
+                mismatches += 1
+    return {
+        "probes":probes,
+        "elapsed":elapsed,
+        "ports_per_second":probes / elapsed if elapsed > 0 else None,
+        "latency":{
+            "p50":percentile(scan.latencies,50),
+            "p99":percentile(scan.latencies,99),
+            "max":max(scan.latencies) if scan.latencies else None,
+        },
+        "peak_rss":peakRss(),
+        "peak_threads":sampler.threads,
+        "peak_fds":sampler.fds,
+        "found":found,
+        "mismatches":mismatches,
+        "errors":{kind:len(errors) for kind,errors in result["errors"].items()},
+    }
+
+def runs(args):
+    for engine in args.engines:
+        if engine == "thread":
+            for threads in args.threads:
+                yield {"engine":engine,"threads":threads,"concurrency":None}
+        else:
+            for concurrency in args.concurrency:
+                yield {"engine":engine,"threads":None,"concurrency":concurrency}
+
+def optional(value):
+    return None if value == "auto" else int(value)
+
+def parse():
+    parser = argparse.ArgumentParser(prog="bench",description="Benchmark the rnps engines against local listeners")
+    parser.add_argument("--engines",nargs="+",default=["thread","async","select"])
+    parser.add_argument("--threads",type=optional,nargs="+",default=[None],help="-t values of the thread engine, auto for the default")
+    parser.add_argument("--concurrency",type=optional,nargs="+",default=[None],help="-c values of the async and select engines, auto for the default")
+    parser.add_argument("--ports",type=int,default=5000,help="number of ports scanned")
+    parser.add_argument("--open",type=int,default=50,help="number of open ports")
+    parser.add_argument("--filtered",type=int,default=10,help="number of ports that never answer")
+    parser.add_argument("--base",type=int,default=30000,help="first port of the range")
+    parser.add_argument("--repeat",type=int,default=3,help="runs of every configuration")
+    parser.add_argument("--min-timeout",type=float,default=None)
+    parser.add_argument("--max-timeout",type=float,default=0.5)
+    parser.add_argument("-o","--output",type=str,help="write the JSON report to a file instead of stdout")
+    parser.add_argument("--worker",action="store_true",help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse()
+    if args.worker:
+        json.dump(worker(json.load(sys.stdin)),sys.stdout)
+        return
+
+    report = {
+        "python":platform.python_version(),
+        "platform":platform.platform(),
+        "cpus":os.cpu_count(),
+        "ports":args.ports,
+        "open":args.open,
+        "filtered":args.filtered,
+        "runs":[],
+    }
+    with Listeners(args.base,args.ports,args.open,args.filtered) as listeners:
+        expected = {str(port):state for port,state in listeners.expected.items()}
+        for run in runs(args):
+            config = dict(run,ports=listeners.ports(),expected=expected,
+                          min_timeout=args.min_timeout,max_timeout=args.max_timeout)
+            for repeat in range(args.repeat):
+                process = subprocess.run([sys.executable,os.path.abspath(__file__),"--worker"],
+                                         input=json.dumps(config),capture_output=True,text=True)
+                if process.returncode != 0:
+                    sys.stderr.write(process.stderr)
+                    sys.exit(process.returncode)
+                measure = json.loads(process.stdout)
+                report["runs"].append(dict(run,repeat=repeat,**measure))
+                sys.stderr.write("{engine} threads={threads} concurrency={concurrency} : ".format(**run)
+                                 + "{:.0f} ports/s, p99 {:.4f}s, {} mismatches\n".format(
+                                     measure["ports_per_second"] or 0,measure["latency"]["p99"] or 0,measure["mismatches"]))
+                # the closed connections leave the TIME_WAIT state before the next run
+                sleep(0.5)
+
+    content = json.dumps(report,indent=2)
+    if args.output is not None:
+        with open(args.output,"w") as f:
+            f.write(content + "\n")
+    else:
+        print(content)
+
+if __name__ == "__main__":
+    main()
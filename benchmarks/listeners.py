@@ -0,0 +1,115 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+import selectors
+import socket
+from threading import Event, Thread
+
+class Listeners:
+    # local ports for the benchmarks, a range split in open ports (accepting
+    # and closing every connection), filtered ports (a listener with a full
+    # backlog that never accepts, the probes time out) and closed ports
+    # (nothing bound, the connection is refused)
+    ADDRESS = "127.0.0.1"
+
+    def __init__(self,base,count,opened,filtered) -> None:
+        self.base = base
+        self.count = count
+        self.opened = opened
+        self.filtered = filtered
+        self.sockets = []
+        self.fillers = []
+        self.expected = {}
+        self.selector = selectors.DefaultSelector()
+        self.stopping = Event()
+        self.thread = Thread(target=self.accept,name="RNPS-Bench-Listeners",daemon=True)
+
+    def start(self):
+        # open and filtered ports are spread evenly over the range
+        step = max(1,self.count // max(1,self.opened + self.filtered))
+        special = list(range(self.base,self.base + self.count,step))[:self.opened + self.filtered]
+        states = {port:"open" for port in special[:self.opened]}
+        states.update({port:"filtered" for port in special[self.opened:]})
+        for port in range(self.base,self.base + self.count):
+            state = states.get(port,"closed")
+            try:
+                sock = self.bind(port)
+            except OSError:
+                # a port used by someone else is left out of the benchmark
+                continue
+            if state == "open":
+                sock.listen(socket.SOMAXCONN)
+                sock.setblocking(False)
+                self.selector.register(sock,selectors.EVENT_READ)
+                self.sockets.append(sock)
+            elif state == "filtered":
+                sock.listen(0)
+                self.sockets.append(sock)
+                self.fill(port)
+            else:
+                sock.close()
+            self.expected[port] = state
+        self.thread.start()
+        return self
+
+    def bind(self,port):
+        sock = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+        # the connections of a previous benchmark may still be in TIME_WAIT
+        sock.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+        try:
+            sock.bind((self.ADDRESS,port))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def fill(self,port):
+        # the only connection the backlog holds is never accepted,
+        # every other SYN is dropped
+        sock = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+        sock.settimeout(1)
+        sock.connect((self.ADDRESS,port))
+        self.fillers.append(sock)
+
+    def accept(self):
+        while not self.stopping.is_set():
+            for key,mask in self.selector.select(0.1):
+                while True:
+                    try:
+                        conn,_ = key.fileobj.accept()
+                    except (BlockingIOError,InterruptedError):
+                        break
+                    except OSError:
+                        break
+                    conn.close()
+
+    def ports(self):
+        return sorted(self.expected)
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+        self.selector.close()
+        for sock in self.sockets + self.fillers:
+            sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self,*args):
+        self.stop()
@@ -0,0 +1,116 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+# Startup check of the command line, for the scripts running rnps many times.
+# The modules imported by rnps.py are timed with python -X importtime and checked
+# against a budget, the modules only needed by some scans must not be imported,
+# then a scan of one closed local port is timed from start to end. Examples :
+#     python benchmarks/startup.py
+#     python benchmarks/startup.py --budget 60 --runs 15
+
+import argparse
+import json
+import os
+import platform
+import socket
+from statistics import median
+import subprocess
+import sys
+from time import perf_counter
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","src")
+# the modules of rnps.py
+IMPORTS = "import rnps.output, rnps.progress, rnps.validator"
+# loaded on demand, by the engines, the outputs and the options that use them
+LAZY = ["asyncio","concurrent.futures","multiprocessing","json","pickle","zlib","ssl","datetime","random",
+        "rnps.services","rnps.frequency","rnps.banner","rnps.baseline","rnps.checkpoint","rnps.discovery"]
+
+def importTimes():
+    # {module:(self,cumulative)} in microseconds, and the modules imported at the top level
+    process = subprocess.run([sys.executable,"-X","importtime","-c",IMPORTS],cwd=SRC,capture_output=True,text=True)
+    if process.returncode != 0:
+        sys.stderr.write(process.stderr)
+        sys.exit(process.returncode)
+    times = {}
+    top = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own,cumulative,name = line[len("import time:"):].split("|",2)
+        times[name.strip()] = (int(own),int(cumulative))
+        if not name[1:].startswith(" "):
+            top.append(name.strip())
+    return times,top
+
+def closedPort():
+    # a port just released, nobody listens on it
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1",0))
+        return sock.getsockname()[1]
+
+def elapsed(command):
+    start = perf_counter()
+    subprocess.run(command,cwd=SRC,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL,check=True)
+    return perf_counter() - start
+
+def parse():
+    parser = argparse.ArgumentParser(prog="startup",description="Check the startup time of the rnps command line")
+    parser.add_argument("--budget",type=float,default=60,help="milliseconds allowed to import the modules of rnps.py")
+    parser.add_argument("--runs",type=int,default=9,help="runs of every measure, the median is kept")
+    parser.add_argument("-o","--output",type=str,help="write the JSON report to a file instead of stdout")
+    return parser.parse_args()
+
+def main():
+    args = parse()
+    # the median of the runs, a single slow run (a cold cache, a busy machine) doesn't fail the check
+    totals = []
+    for run in range(args.runs):
+        times,top = importTimes()
+        totals.append(sum(times[name][1] for name in top if name.startswith("rnps")))
+    imports = median(totals)
+    port = closedPort()
+    python = median(elapsed([sys.executable,"-c","pass"]) for run in range(args.runs))
+    scan = median(elapsed([sys.executable,"rnps.py","127.0.0.1","-p",str(port)]) for run in range(args.runs))
+    loaded = [name for name in LAZY if name in times]
+    report = {
+        "python":platform.python_version(),
+        "platform":platform.platform(),
+        "budget_ms":args.budget,
+        "imports_ms":round(imports / 1000,2),
+        "slowest":sorted(((name,round(times[name][0] / 1000,2)) for name in times),key=lambda t: -t[1])[:10],
+        "eager":loaded,
+        "interpreter_ms":round(python * 1000,2),
+        "single_port_scan_ms":round(scan * 1000,2),
+    }
+    content = json.dumps(report,indent=2)
+    if args.output is not None:
+        with open(args.output,"w") as f:
+            f.write(content + "\n")
+    else:
+        print(content)
+    failed = False
+    if imports / 1000 > args.budget:
+        sys.stderr.write("The imports take {:.1f} ms, over the budget of {:.1f} ms\n".format(imports / 1000,args.budget))
+        failed = True
+    if len(loaded) > 0:
+        sys.stderr.write("Imported at startup, they should be loaded on demand : {}\n".format(", ".join(loaded)))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -20,37 +20,28 @@
 
 import signal
 import sys
-from time import sleep
 from rnps.output import Output
+from rnps.progress import Renderer
 from rnps.validator import Validator
 
-loadingCounter = 0
-
-def loading():
-    global loadingCounter
-    bar = [
-        " [■     ]",
-        " [■■    ]",
-        " [■■■   ]",
-        " [■■■■  ]",
-        " [■■■■■ ]",
-        " [■■■■■■]",
-        " [ ■■■■■]",
-        " [  ■■■■]",
-        " [   ■■■]",
-        " [    ■■]",
-        " [     ■]",
-        " [      ]",
-    ]
-    print(bar[loadingCounter % len(bar)], end="\r")
-    sleep(.2)
-    loadingCounter += 1
+scan = None
 
 def abort(f,s):
+    # with a checkpoint the first Ctrl-C lets the probes in flight complete
+    # and saves the progress, the second one quits at once
+    if scan is not None and scan.checkpoint is not None and not scan.stopping.is_set():
+        print(f"Stopping... saving checkpoint to {scan.checkpoint.filename}")
+        scan.stop()
+        return
     print("Aborting...")
     exit()
 
 def main():
+    global scan
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from rnps.server import serve
+        serve(sys.argv[2:])
+        return
     signal.signal(signal.SIGINT,abort)
     try:
         val = Validator()
@@ -60,14 +51,23 @@ def main():
             for e in errs:
                 print("{}".format(e))
             exit()
-        sys.stdout.write(out.header())
+        # nothing but the records goes to stdout when streaming there
+        quiet = val.ndjson() and val.filename() is None
+        if not quiet:
+            sys.stdout.write(out.header())
         scan = val.getScan()
-        scan.start()
-        while scan.is_alive():
-            loading()
+        while scan is not None:
+            scan.start()
+            if quiet:
+                scan.progress.wait()
+            else:
+                Renderer(scan.progress).run()
+            scan.join()
 
-        out.setResult(scan.result())
-        out.send()
+            out.setResult(scan.result())
+            out.send()
+            val.saveMetrics()
+            scan = val.getSweepScan()
     except:
         pass
 
@@ -20,11 +20,20 @@ import argparse
 import itertools
 import sys
 import textwrap
+from rnps.defaults import Defaults
+from rnps.engine import Engine
+from rnps.metrics import Metrics
 from rnps.version import Version
-from rnps.port import Port
+from rnps.port import Port, PortFrequency
+from rnps.timing import Timing
+
+class ArgsException(Exception):
+
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
 
 class Args:
-    def __init__(self) -> None:
+    def __init__(self,argv=None) -> None:
         self.parser = argparse.ArgumentParser(
             prog='rnps',
             formatter_class=argparse.RawTextHelpFormatter,
@@ -33,13 +42,21 @@ class Args:
                 Ver {Version.MAJOR}.{Version.MINOR}.{Version.PATCH}
             ''')
         )
-        self.parser.add_argument('host',type=str,metavar='<HOST>',help=textwrap.dedent('''\
-            The hostname or IP address.
+        self.parser.add_argument('host',type=str,nargs='*',metavar='<HOST>',help=textwrap.dedent('''\
+            The hostname or IP address, one or more.
             You can enter a CIDR notation to specify an address range.
+            Hostnames are scanned on every address they resolve to (IPv4 and IPv6).
             Examples :
                 www.example.com
                 192.168.1.100
                 192.168.1.0/24
+                192.168.1.0/24 10.0.0.1 www.example.com
+            '''))
+        self.parser.add_argument('-iL','--input-list',type=str,metavar='FILE',help=textwrap.dedent('''\
+            Read the targets from a file, one or more per line (blank lines and # comments are skipped).
+            Use - to read them from the standard input. Examples :
+                -iL targets.txt
+                cat targets.txt | rnps -iL - --top 100
             '''))
         self.parser.add_argument('-p','--port',type=int,nargs='+',help=textwrap.dedent('''\
             The port to be scanned.
@@ -73,30 +90,190 @@ class Args:
             Scan all free/unregistered ports range
             from 49152 to 65535
             '''))
+        self.parser.add_argument('--top',type=self.positive_int,metavar='N',help=textwrap.dedent('''\
+            Scan the N ports most frequently found open,
+            ordered from the most frequent one (see --order)
+            '''))
+        self.parser.add_argument('--order',type=str,choices=PortFrequency.ORDERS,help=textwrap.dedent('''\
+            The order in which the ports of each host are scanned.
+                numeric   : from the lowest port to the highest (default)
+                frequency : the ports most frequently found open first,
+                            useful with --ndjson to get the findings early (default with --top)
+            '''))
+        self.parser.add_argument('--randomize',action='store_true',help=textwrap.dedent('''\
+            Scan the targets in a random order, spreading the probes evenly over all the hosts
+            instead of sending every probe of a host in one burst.
+            The order takes no memory, whatever the number of targets
+            '''))
+        self.parser.add_argument('--seed',type=int,metavar='N',help=textwrap.dedent('''\
+            The seed of the random order, to repeat the same scan. Implies --randomize.
+            Without it a new seed is drawn and shown in the command line of the result
+            '''))
         self.parser.add_argument('--udp',action='store_true',help=textwrap.dedent('''\
             Specifies that the ports to be scanned are UDP
             '''))
         self.parser.add_argument('--json',action='store_true',help=textwrap.dedent('''\
             Output format to JSON
             '''))
+        self.parser.add_argument('--ndjson',action='store_true',help=textwrap.dedent('''\
+            Stream the results as newline delimited JSON, one record per open port
+            (or per port with -v) written as soon as the probe completes,
+            followed by a summary record. Can be combined with -f
+            '''))
         self.parser.add_argument('-f','--file',type=str,help=textwrap.dedent('''\
             Save the scan result to a file
             Examples :
                 -f my_scan.txt
             '''))
+        self.parser.add_argument('--services',type=str,metavar='FILE',help=textwrap.dedent('''\
+            A file of custom service names, in the /etc/services format.
+            Its names override the built-in ones and the system ones.
+            Examples :
+                myapp  8080/tcp
+            '''))
+        self.parser.add_argument('--banners',action='store_true',help=textwrap.dedent('''\
+            Read the banner of every open TCP port and fingerprint its service
+            (SSH, HTTP, TLS, SMTP, FTP ...) while the scan goes on.
+            The connection opened by the probe is used first, waiting for a greeting
+            and then sending an HTTP HEAD request or a TLS handshake.
+            Not used with --udp
+            '''))
+        self.parser.add_argument('--banner-concurrency',type=int,metavar='N',help=textwrap.dedent(f'''\
+            With --banners, the number of banners read at the same time.
+            Default : {Defaults.BANNER_CONCURRENCY}
+            '''))
+        self.parser.add_argument('--banner-timeout',type=float,metavar='SECONDS',help=textwrap.dedent(f'''\
+            With --banners, the time given to each open port to be fingerprinted.
+            Default : {Defaults.BANNER_TIMEOUT}
+            '''))
         self.parser.add_argument('-v','--verbose',action='store_true',help=textwrap.dedent('''\
             View all results
             '''))
         self.parser.add_argument('-t','--max-threads',type=int,help=textwrap.dedent('''\
             Limit the use of threads to a specific value.
-            On some OS the use of processes per user is limited, 
-            if you find incomplete scans try to reduce the number of threads generated.
+            On some OS the use of processes per user is limited, the thread engine reads
+            this limit at startup and lowers the number of threads when it is reached.
+            If you still find incomplete scans try to reduce the number of threads generated.
             A common value of this limit is 1024, 
             try to set it lower (consider the processes already active on the system)
             Too low value will increase the execution time
             '''))
-        self.args = self.parser.parse_args()
-        self.cmdline = " ".join(arg for index,arg in enumerate(sys.argv) if index != 0)
+        self.parser.add_argument('--engine',type=str,choices=Engine.names(),help=textwrap.dedent('''\
+            The engine used to run the probes.
+                thread : one thread per probe, limited by -t (default)
+                async  : non-blocking sockets on a single event loop,
+                         not affected by the processes limit of the OS
+                select : non-blocking sockets polled in batches with
+                         selectors (epoll on Linux), the fastest one
+                udp    : a pool of connected UDP sockets polled with selectors,
+                         tells closed ports from open|filtered ones (default with --udp)
+            '''))
+        self.parser.add_argument('-c','--concurrency',type=self.positive_int,help=textwrap.dedent(f'''\
+            Maximum number of probes in flight with the async and select engines.
+            By default the scan starts with {Engine.DEFAULT_CONCURRENCY} probes and adapts it to the open files limit (ulimit -n),
+            lowering it when the system runs out of resources and raising it again when the probes succeed.
+            When set, the concurrency never grows beyond this value
+            '''))
+        self.parser.add_argument('--processes',type=int,metavar='N',help=textwrap.dedent('''\
+            Split the scan across N processes, each one running its own engine.
+            Useful for large CIDR sweeps, the -t and -c parameters apply to each process.
+            Use 0 to start one process per CPU core
+            '''))
+        self.parser.add_argument('--rate',type=self.positive_float,metavar='N',help=textwrap.dedent('''\
+            Send at most N probes per second, at a steady pace.
+            Bursts of connections can trip an IDS or fill the tables of stateful firewalls,
+            that drop the packets and report ports as closed.
+            With --udp the default is 1000, and the probes of each host slow down
+            when its ICMP errors stop coming back (about one per second on most systems)
+            '''))
+        self.parser.add_argument('--burst',type=self.positive_int,metavar='M',help=textwrap.dedent('''\
+            With --rate, the number of probes that can be sent at once
+            after a pause. Default : the probes of 10 milliseconds
+            '''))
+        self.parser.add_argument('--min-timeout',type=self.positive_float,metavar='SECONDS',help=textwrap.dedent(f'''\
+            The shortest timeout of a probe.
+            Each probe waits for the round-trip time measured on its host (smoothed RTT plus variance),
+            clamped between --min-timeout and --max-timeout.
+            Default : {Timing.MIN_TIMEOUT}
+            '''))
+        self.parser.add_argument('--max-timeout',type=self.positive_float,metavar='SECONDS',help=textwrap.dedent(f'''\
+            The longest timeout of a probe, raise it on high-latency links.
+            Until a host answers the first time, its probes wait {Timing.INITIAL_TIMEOUT} second.
+            Default : {Timing.MAX_TIMEOUT}
+            '''))
+        self.parser.add_argument('--no-discovery',action='store_true',help=textwrap.dedent(f'''\
+            When scanning an address range, rnps first looks for the hosts up
+            probing the TCP ports {" ".join(str(p) for p in Defaults.DISCOVERY_PORTS)} (a refused connection counts as up),
+            then scans the ports only on the hosts that answered.
+            This parameter disables the discovery and scans every address
+            '''))
+        self.parser.add_argument('--checkpoint',type=str,metavar='FILE',help=textwrap.dedent(f'''\
+            Save the progress of the scan to a file every {Defaults.CHECKPOINT_INTERVAL} seconds,
+            and when the scan is interrupted with Ctrl-C (press it twice to quit at once).
+            The scan can be continued later with --resume
+            '''))
+        self.parser.add_argument('--resume',type=str,metavar='FILE',help=textwrap.dedent('''\
+            Continue an interrupted scan from its checkpoint file,
+            with the same parameters. Examples :
+                --resume my_scan.ckpt
+            '''))
+        self.parser.add_argument('--baseline',type=str,metavar='FILE',help=textwrap.dedent(f'''\
+            Rescan comparing with a previous scan, saved with --json, --ndjson or --checkpoint.
+            Only the ports open in the baseline and a sample of the other targets are probed,
+            and only the changes are reported (newly opened, newly closed ports)
+            '''))
+        self.parser.add_argument('--sample',type=int,metavar='N',help=textwrap.dedent(f'''\
+            With --baseline, the number of random targets probed besides the known open ports.
+            Default : {Defaults.BASELINE_SAMPLE}
+            '''))
+        self.parser.add_argument('--full-sweep',action='store_true',help=textwrap.dedent('''\
+            With --baseline, after reporting the changes found by the quick rescan,
+            scan every target and report the changes again
+            '''))
+        self.parser.add_argument('--metrics-file',type=str,metavar='FILE',help=textwrap.dedent('''\
+            Save the metrics of the probes to a file when the scan ends :
+            probes and errors by result, latency histograms by result, time spent
+            by the targets waiting to be probed, retries and probes in flight
+            '''))
+        self.parser.add_argument('--metrics-format',type=str,choices=Metrics.FORMATS,help=textwrap.dedent('''\
+            The format of the metrics file, the Prometheus text format or JSON.
+            Default : json when the file name ends with .json, prometheus otherwise
+            '''))
+        # the arguments of the command line, or a list given by a program
+        self.argv = list(argv) if argv is not None else sys.argv[1:]
+        self.args = self.parser.parse_args(self.argv)
+        # no file is read while parsing, the checkpoint of --resume is read by resume()
+        self.state = None
+        self.hosts = None
+        self.check()
+
+    def check(self):
+        if len(self.args.host) == 0 and self.args.input_list is None and self.args.resume is None:
+            self.parser.error("the following arguments are required: <HOST>")
+        if self.args.min_timeout is not None and self.args.max_timeout is not None and self.args.min_timeout > self.args.max_timeout:
+            self.parser.error("--min-timeout can't be longer than --max-timeout")
+        if self.args.input_list == "-" and (self.args.checkpoint is not None or self.args.resume is not None):
+            self.parser.error("the targets read from the standard input can't be checkpointed, use a file")
+        if self.args.randomize and self.args.seed is None and self.args.resume is None:
+            # the seed drawn is kept with the arguments, so a checkpoint
+            # resumes the scan in the same order
+            import random
+            self.args.seed = random.getrandbits(32)
+            self.argv = self.argv + ["--seed",str(self.args.seed)]
+        self.cmdline = " ".join(self.argv)
+
+    def resume(self):
+        # the scan goes on with the parameters saved in the checkpoint
+        if self.args.resume is None or self.state is not None:
+            return
+        from rnps.checkpoint import Checkpoint
+        resume = self.args.resume
+        self.state = Checkpoint.read(resume)
+        self.argv = self.state["argv"]
+        self.args = self.parser.parse_args(self.argv)
+        self.args.resume = resume
+        self.hosts = None
+        self.check()
 
     def exlude_port(self,args):
         try:
@@ -112,6 +289,26 @@ class Args:
         except Exception:
             raise argparse.ArgumentTypeError('Invalid port range {}'.format(args))
 
+    @staticmethod
+    def positive_float(args):
+        try:
+            value = float(args)
+        except ValueError:
+            raise argparse.ArgumentTypeError('Invalid number {}'.format(args))
+        if not 0 < value < float('inf'):
+            raise argparse.ArgumentTypeError('Must be a finite number greater than 0, not {}'.format(args))
+        return value
+
+    @staticmethod
+    def positive_int(args):
+        try:
+            value = int(args)
+        except ValueError:
+            raise argparse.ArgumentTypeError('Invalid integer {}'.format(args))
+        if value < 1:
+            raise argparse.ArgumentTypeError('Must be at least 1, not {}'.format(args))
+        return value
+
     def port_range(self,args):
         try:
             a = args.split('-')
@@ -120,7 +317,30 @@ class Args:
             raise argparse.ArgumentTypeError('Invalid port range {}'.format(args))
         
     def getHost(self):
-        return self.args.host
+        return self.getHosts()[0]
+
+    def getHosts(self):
+        # the targets of the command line, then the ones of the input list, read once
+        if self.hosts is None:
+            self.hosts = list(self.args.host)
+            if self.args.input_list is not None:
+                try:
+                    if self.args.input_list == "-":
+                        self.hosts += self.readTargets(sys.stdin)
+                    else:
+                        with open(self.args.input_list) as f:
+                            self.hosts += self.readTargets(f)
+                except OSError as e:
+                    # read after the parsing, the error goes to the caller as any other
+                    raise ArgsException("Can't read the targets of {} : {}".format(self.args.input_list,e))
+        return self.hosts
+
+    @staticmethod
+    def readTargets(f):
+        targets = []
+        for line in f:
+            targets += line.split("#",1)[0].replace(","," ").split()
+        return targets
     
     def getPorts(self):
         ports = self.args.port if self.args.port is not None else []
@@ -130,15 +350,26 @@ class Args:
         registered =  Port.REGISTERED_RANGE if self.args.registered else []
         reserved =  Port.RESERVED_RANGE if self.args.reserved else []
         free =  Port.FREE_RANGE if self.args.free else []
+        top = PortFrequency.top(self.args.top,self.getPortType()) if self.args.top is not None else []
         port_list = list()
-        for p in itertools.chain(ports,port_range,all,registered,reserved,free):
+        for p in itertools.chain(ports,port_range,all,registered,reserved,free,top):
             port_list.append(p)
 
         port_list = sorted(set(port_list) - set(exclude))
         if len(port_list) == 0:
             port_list = [80]
+        if self.getOrder() == PortFrequency.FREQUENCY:
+            port_list = PortFrequency.sort(port_list,self.getPortType())
         return port_list
+
+    def getOrder(self):
+        if self.args.order is not None:
+            return self.args.order
+        return PortFrequency.FREQUENCY if self.args.top is not None else PortFrequency.NUMERIC
     
+    def getSeed(self):
+        return self.args.seed
+
     def getPortType(self):
         return Port.UDP if self.args.udp else Port.TCP
 
@@ -148,6 +379,12 @@ class Args:
     def isJSON(self):
         return self.args.json
 
+    def getServicesFile(self):
+        return self.args.services
+
+    def isNDJSON(self):
+        return self.args.ndjson
+
     def filename(self):
         return self.args.file
 
@@ -155,4 +392,62 @@ class Args:
         return self.cmdline
 
     def getMaxThreads(self):
-        return self.args.max_threads
\ No newline at end of file
+        return self.args.max_threads
+
+    def getEngine(self):
+        return self.args.engine
+
+    def getConcurrency(self):
+        return self.args.concurrency
+
+    def getProcesses(self):
+        return self.args.processes
+
+    def isDiscovery(self):
+        return not self.args.no_discovery
+
+    def getCheckpoint(self):
+        # a resumed scan keeps saving its progress to the same file
+        filename = self.args.resume if self.args.resume is not None else self.args.checkpoint
+        if filename is None:
+            return None
+        from rnps.checkpoint import Checkpoint
+        checkpoint = Checkpoint(filename,self.argv)
+        if self.args.resume is not None:
+            checkpoint.resume(self.state)
+        return checkpoint
+
+    def getBaseline(self):
+        if self.args.baseline is None:
+            return None
+        from rnps.baseline import Baseline
+        return Baseline(self.args.baseline,self.args.sample)
+
+    def isFullSweep(self):
+        return self.args.baseline is not None and self.args.full_sweep
+
+    def getMetricsFile(self):
+        return self.args.metrics_file
+
+    def getMetricsFormat(self):
+        if self.args.metrics_format is not None:
+            return self.args.metrics_format
+        return Metrics.JSON if self.args.metrics_file.lower().endswith(".json") else Metrics.PROMETHEUS
+
+    def getBanners(self):
+        if not self.args.banners or self.args.udp:
+            return None
+        from rnps.banner import Banners
+        return Banners(self.args.banner_concurrency,self.args.banner_timeout)
+
+    def getRate(self):
+        return self.args.rate
+
+    def getBurst(self):
+        return self.args.burst
+
+    def getMinTimeout(self):
+        return self.args.min_timeout
+
+    def getMaxTimeout(self):
+        return self.args.max_timeout
\ No newline at end of file
@@ -0,0 +1,218 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+import socket
+from threading import Lock
+from time import monotonic
+from rnps.defaults import Defaults
+from rnps.version import Version
+
+class Banners:
+    # the second stage of a TCP scan, the open ports are fingerprinted
+    # by a pool of its own while the probes go on.
+    # The socket connected by the probe is handed over and used first,
+    # a new connection is opened only when a second probe is needed
+    CONCURRENCY = Defaults.BANNER_CONCURRENCY
+    TIMEOUT = Defaults.BANNER_TIMEOUT
+    # the time a server speaking first (SSH, SMTP, FTP ...) is given to do it
+    WAIT = 0.5
+    SIZE = 4096
+    LENGTH = 120
+    # the connections kept waiting for a worker, the ports queued beyond
+    # them are connected again so the probes don't run out of file descriptors
+    KEEP = 256
+    TLS_PORTS = (261,443,448,465,563,585,614,636,853,989,990,992,993,994,995,2083,2087,2096,5061,5986,6697,8443,8883,9443)
+
+    def __init__(self,concurrency=None,timeout=None) -> None:
+        self.concurrency = concurrency if concurrency is not None else self.CONCURRENCY
+        self.timeout = timeout if timeout is not None else self.TIMEOUT
+        self.scan = None
+        self.executor = None
+        self.pending = set()
+        self.lock = Lock()
+
+    def __getstate__(self):
+        return {"concurrency":self.concurrency,"timeout":self.timeout}
+
+    def __setstate__(self,state):
+        self.__init__(state["concurrency"],state["timeout"])
+
+    def attach(self,scan):
+        self.scan = scan
+
+    def submit(self,address,port,sock=None):
+        # called by the engines, it never blocks the probes
+        import concurrent.futures
+        with self.lock:
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency,thread_name_prefix="RNPS-Banner")
+            if sock is not None and len(self.pending) < self.KEEP:
+                try:
+                    sock = sock.dup()
+                    self.pending.add(sock)
+                except OSError:
+                    sock = None
+            else:
+                sock = None
+            self.executor.submit(self.grab,address,port,sock)
+
+    def join(self):
+        # waits for the banners still being read, the ones queued
+        # are dropped when the scan was stopped
+        with self.lock:
+            executor,self.executor = self.executor,None
+        if executor is None:
+            return
+        executor.shutdown(wait=True,cancel_futures=self.scan.stopping.is_set())
+        with self.lock:
+            for sock in self.pending:
+                sock.close()
+            self.pending.clear()
+
+    def grab(self,address,port,sock):
+        deadline = monotonic() + self.timeout
+        try:
+            if sock is None:
+                sock = socket.create_connection((str(address),port),timeout=self.timeout)
+            banner = self.fingerprint(str(address),port,sock,deadline)
+        except Exception:
+            banner = None
+        finally:
+            if sock is not None:
+                sock.close()
+                with self.lock:
+                    self.pending.discard(sock)
+        if banner is not None:
+            self.scan.addBanner(str(address),port,banner)
+
+    @staticmethod
+    def remaining(deadline):
+        return max(0.001,deadline - monotonic())
+
+    def fingerprint(self,host,port,sock,deadline):
+        sock.setblocking(True)
+        data = self.read(sock,min(self.WAIT,self.remaining(deadline)))
+        if data is None:
+            return None
+        if len(data) > 0:
+            return self.identify(data)
+        if port in self.TLS_PORTS:
+            return self.tls(host,port,sock,deadline)
+        banner = self.http(host,port,sock,deadline)
+        if banner is not None and banner["service"] != "tls":
+            return banner
+        # the server answered with a TLS alert, or asked for HTTPS,
+        # the handshake needs a connection of its own
+        if monotonic() >= deadline:
+            return banner
+        with socket.create_connection((host,port),timeout=self.remaining(deadline)) as other:
+            return self.tls(host,port,other,deadline) or banner
+
+    def read(self,sock,timeout,until=None):
+        # b"" when nothing came before the timeout, None when the connection was lost
+        sock.settimeout(timeout)
+        data = b""
+        try:
+            while len(data) < self.SIZE:
+                chunk = sock.recv(self.SIZE - len(data))
+                if not chunk:
+                    break
+                data += chunk
+                if until is None or until in data:
+                    break
+        except socket.timeout:
+            pass
+        except OSError:
+            return data if len(data) > 0 else None
+        return data
+
+    def identify(self,data):
+        text = self.text(data)
+        if data.startswith(b"SSH-"):
+            return self.banner("ssh",text)
+        if data.startswith(b"HTTP/"):
+            return self.banner("http",text)
+        if data.startswith(b"220"):
+            return self.banner("ftp" if b"FTP" in data.upper() else "smtp",text)
+        if data.startswith(b"+OK"):
+            return self.banner("pop3",text)
+        if data.startswith(b"* OK"):
+            return self.banner("imap",text)
+        if data.startswith(b"RFB "):
+            return self.banner("vnc",text)
+        if data[:1] in (b"\x15",b"\x16") and data[1:2] == b"\x03":
+            return self.banner("tls","")
+        if len(data) > 5 and data[4] == 10:
+            # the handshake packet of MySQL, protocol 10 followed by the server version
+            return self.banner("mysql",self.text(data[5:].split(b"\0")[0]))
+        return self.banner("unknown",text)
+
+    def http(self,host,port,sock,deadline):
+        request = f"HEAD / HTTP/1.0\r\nHost: {self.authority(host,port)}\r\nUser-Agent: rnps/{Version.MAJOR}.{Version.MINOR}.{Version.PATCH}\r\n\r\n"
+        try:
+            sock.sendall(request.encode())
+        except OSError:
+            return None
+        data = self.read(sock,self.remaining(deadline),b"\r\n\r\n")
+        if not data:
+            return None
+        if not data.startswith(b"HTTP/"):
+            return self.identify(data)
+        banner = self.banner("http",self.httpSummary(data))
+        if b" 400 " in data.split(b"\r\n")[0] and b"HTTPS" in data.upper():
+            banner["service"] = "tls"
+        return banner
+
+    def httpSummary(self,data):
+        lines = data.split(b"\r\n")
+        summary = self.text(lines[0])
+        for line in lines[1:]:
+            if line.lower().startswith(b"server:"):
+                summary += ", " + self.text(line)
+        return summary[:self.LENGTH]
+
+    def tls(self,host,port,sock,deadline):
+        # the handshake is made without checking the certificate, only the
+        # protocol and the cipher agreed are kept, then the same HEAD request
+        import ssl
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        sock.settimeout(self.remaining(deadline))
+        try:
+            with context.wrap_socket(sock) as tls:
+                summary = f"{tls.version()} {tls.cipher()[0]}"
+                if monotonic() < deadline:
+                    banner = self.http(host,port,tls,deadline)
+                    if banner is not None and banner["service"] == "http":
+                        return self.banner("https",f"{summary}, {banner['banner']}"[:self.LENGTH])
+                return self.banner("tls",summary)
+        except (ssl.SSLError,OSError):
+            return None
+
+    @staticmethod
+    def authority(host,port):
+        return f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+
+    def text(self,data):
+        line = data.split(b"\n")[0].decode("latin-1").strip()
+        return "".join(c if c.isprintable() else "." for c in line)[:self.LENGTH]
+
+    @staticmethod
+    def banner(service,text):
+        return {"service":service,"banner":text}
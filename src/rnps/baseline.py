@@ -0,0 +1,117 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+
+from ipaddress import ip_address
+from rnps.checkpoint import Checkpoint
+from rnps.defaults import Defaults
+from rnps.targets import TargetList
+
+class BaselineException(Exception):
+
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+class Baseline:
+    SAMPLE = Defaults.BASELINE_SAMPLE
+    SEED = 0x524e5053
+
+    # the open ports of a previous scan, read from its --json or --ndjson output,
+    # or from its checkpoint file
+    def __init__(self,filename,sample=None,full=False) -> None:
+        self.filename = filename
+        self.sample = sample if sample is not None else self.SAMPLE
+        self.full = full
+        self.scope = None
+        self.open = self.load(filename)
+
+    def sweep(self):
+        # the same baseline, compared with a scan of every target
+        baseline = Baseline.__new__(Baseline)
+        baseline.__dict__.update(self.__dict__)
+        baseline.full = True
+        return baseline
+
+    @staticmethod
+    def load(filename):
+        try:
+            with open(filename,"rb") as f:
+                content = f.read()
+        except OSError as e:
+            raise BaselineException("Can't read the baseline {} : {}".format(filename,e))
+        if content[:1] in (b"{",b"["):
+            import json
+            text = content.decode()
+            try:
+                return Baseline.fromResult(json.loads(text))
+            except json.JSONDecodeError:
+                return Baseline.fromRecords(json.loads(line) for line in text.splitlines() if len(line.strip()) > 0)
+        return Baseline.fromResult(Checkpoint.read(filename)["result"])
+
+    @staticmethod
+    def fromResult(result):
+        open = set()
+        for host in result["hosts"]:
+            for port in result["hosts"][host]:
+                if port["result"] == 0:
+                    open.add((host,port["port"],port["port_type"]))
+        return open
+
+    @staticmethod
+    def fromRecords(records):
+        open = set()
+        for record in records:
+            if record.get("type") == "port" and record["result"] == 0:
+                open.add((record["host"],record["port"],record["port_type"]))
+        return open
+
+    def getOpen(self,port_type):
+        return {(host,port) for host,port,t in self.open if t == port_type}
+
+    def getTargets(self,space,port_type,shard=None):
+        # the known open ports first, then a sample of the whole scan,
+        # the same in every process
+        self.scope = space
+        if self.full:
+            return space
+        # only the open ports still in the hosts and ports requested
+        known = [(host,port) for host,port in self.getOpen(port_type) if space.contains(ip_address(host),port)]
+        known.sort(key=lambda t: (ip_address(t[0]).version,ip_address(t[0]),t[1]))
+        targets = [(ip_address(host),port) for host,port in known]
+        seen = set(known)
+        from random import Random
+        generator = Random(self.SEED)
+        total = space.hosts * len(space.ports)
+        for n in range(min(self.sample,total)):
+            address,port = space.get(generator.randrange(total))
+            if (str(address),port) not in seen:
+                seen.add((str(address),port))
+                targets.append((address,port))
+        return TargetList(targets,shard)
+
+    def diff(self,result,port_type):
+        current = set()
+        for host,ports in result.getHosts().items():
+            for port,code in zip(ports.ports,ports.codes):
+                if code == 0:
+                    current.add((host,port))
+        previous = self.getOpen(port_type)
+        if self.scope is not None:
+            # the ports of other hosts or out of the range were not scanned again
+            previous = {(host,port) for host,port in previous if self.scope.contains(ip_address(host),port)}
+        return sorted(current - previous),sorted(previous - current)
@@ -0,0 +1,117 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+
+from ipaddress import ip_address
+import os
+from time import monotonic
+from rnps.defaults import Defaults
+
+class CheckpointException(Exception):
+
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+class Checkpoint:
+    # JSON compressed with zlib, a checkpoint shared by someone else can't run any code
+    VERSION = 2
+    INTERVAL = Defaults.CHECKPOINT_INTERVAL
+
+    # the completed targets are kept as a watermark (every index below it is done)
+    # plus the few indexes above it that completed out of order
+    def __init__(self,filename,argv) -> None:
+        self.filename = filename
+        self.argv = argv
+        self.watermark = 0
+        self.completed = set()
+        self.addresses = None
+        self.result = None
+        self.targets = None
+        self.saved = monotonic()
+
+    @staticmethod
+    def read(filename):
+        import json
+        import zlib
+        try:
+            with open(filename,"rb") as f:
+                state = json.loads(zlib.decompress(f.read()))
+            if not isinstance(state,dict):
+                raise ValueError("not a checkpoint")
+        except Exception as e:
+            raise CheckpointException("Invalid checkpoint file {} : {}".format(filename,e))
+        if state.get("version") != Checkpoint.VERSION:
+            raise CheckpointException("Unsupported checkpoint file {}".format(filename))
+        state["result"]["hosts"] = {host:Checkpoint.decodeHost(ports) for host,ports in state["result"]["hosts"].items()}
+        return state
+
+    @staticmethod
+    def encodeHost(ports):
+        # the two arrays of a HostResult, see rnps.scan
+        return {"port_type":ports.port_type,"ports":ports.ports.tolist(),"codes":ports.codes.tolist()}
+
+    @staticmethod
+    def decodeHost(ports):
+        from rnps.scan import HostResult
+        result = HostResult(ports["port_type"])
+        result.ports.extend(ports["ports"])
+        result.codes.extend(ports["codes"])
+        return result
+
+    def resume(self,state):
+        self.watermark = state["watermark"]
+        self.completed = set(state["completed"])
+        self.addresses = [ip_address(a) for a in state["addresses"]] if state["addresses"] is not None else None
+        self.result = state["result"]
+
+    def isResuming(self):
+        return self.result is not None
+
+    def attach(self,targets):
+        self.targets = targets
+
+    def isDone(self,index):
+        return index < self.watermark or index in self.completed
+
+    def done(self,host,port):
+        index = self.targets.indexOf(ip_address(host),port)
+        self.completed.add(index)
+        while self.watermark in self.completed:
+            self.completed.remove(self.watermark)
+            self.watermark += 1
+
+    def isDue(self):
+        return monotonic() - self.saved >= self.INTERVAL
+
+    def save(self,result):
+        state = {
+            "version":self.VERSION,
+            "argv":self.argv,
+            "watermark":self.watermark,
+            "completed":sorted(self.completed),
+            "addresses":[str(a) for a in self.targets.addresses] if self.targets.addresses is not None else None,
+            "result":dict(result,hosts={host:self.encodeHost(ports) for host,ports in result["hosts"].items()}),
+        }
+        # written aside and renamed, an interruption never leaves a broken file
+        import json
+        import zlib
+        temp = self.filename + ".tmp"
+        with open(temp,"wb") as f:
+            f.write(zlib.compress(json.dumps(state,separators=(",",":")).encode()))
+        os.replace(temp,self.filename)
+        self.saved = monotonic()
@@ -0,0 +1,26 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+class Defaults:
+    # the defaults shown in the help of the command line, kept here so that
+    # the modules using them are only imported by the scans that need them
+    BANNER_CONCURRENCY = 32
+    BANNER_TIMEOUT = 3
+    CHECKPOINT_INTERVAL = 10
+    BASELINE_SAMPLE = 1000
+    DISCOVERY_PORTS = [22,80,135,443,445,3389,8080]
@@ -0,0 +1,53 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+
+import errno
+from ipaddress import ip_address
+from rnps.defaults import Defaults
+from rnps.port import Port
+from rnps.scan import Scan
+
+class Discovery(Scan):
+    PORTS = Defaults.DISCOVERY_PORTS
+
+    def __init__(self,scan) -> None:
+        super().__init__(   name="RNPS-Discovery-Thread",
+                            host=scan.host,
+                            port=Port(self.PORTS,Port.TCP),
+                            maxThreads=scan.maxThreads,
+                            engine=scan.engine.NAME if Port.TCP in scan.engine.TYPES else None,
+                            concurrency=scan.concurrency,
+                            minTimeout=scan.timing.floor,
+                            maxTimeout=scan.timing.ceiling,
+                            bucket=scan.bucket,
+                            budget=scan.budget,
+                            discovery=False,
+                            addresses=scan.space.addresses,
+                            seed=scan.seed,
+                        )
+        self.alive = set()
+
+    def collect(self,item):
+        # a refused connection is a sign of life as much as an open port
+        if item["result"] == 0 or item["result"] == errno.ECONNREFUSED:
+            self.alive.add(item["host"])
+
+    def getAliveAddresses(self):
+        # IPv4 and IPv6 addresses can't be compared, the IPv4 ones come first
+        return sorted((ip_address(address) for address in self.alive),key=lambda a: (a.version,a))
@@ -0,0 +1,685 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+
+from collections import deque
+import errno
+import heapq
+from ipaddress import IPv4Address
+import itertools
+import os
+import selectors
+import socket
+from time import monotonic, sleep
+from rnps.limits import Budget, Concurrency, Limits
+from rnps.port import Port
+from rnps.timing import HostPacing, TokenBucket
+
+######################################################################################################
+class EngineException(Exception):
+
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+######################################################################################################
+class Engine:
+    NAME = None
+    TYPES = (Port.TCP,Port.UDP)
+    DEFAULT_CONCURRENCY = 1000
+    MAX_CONCURRENCY = 20000
+    MAX_RETRIES = 10
+
+    def __init__(self,scan) -> None:
+        self.scan = scan
+
+    def run(self):
+        raise NotImplementedError
+
+    def getConcurrency(self):
+        return self.scan.concurrency if self.scan.concurrency is not None else self.DEFAULT_CONCURRENCY
+
+    def getMaxConcurrency(self):
+        # every probe holds a file descriptor
+        maximum = self.scan.concurrency if self.scan.concurrency is not None else self.MAX_CONCURRENCY
+        Limits.raiseOpenFiles(maximum)
+        files = Limits.openFiles()
+        return maximum if files is None else min(maximum,files)
+
+    def prepare(self):
+        total = max(1,self.scan.getTotalTargets())
+        maximum = min(self.getMaxConcurrency(),total)
+        self.control = Concurrency(maximum,min(self.getConcurrency(),total))
+        self.targets = self.scan.targets()
+        self.retries = deque()
+        self.attempts = {}
+        self.held = 0
+
+    def getBucket(self):
+        return self.scan.bucket
+
+    def hold(self,inflight,wanted=None):
+        # the probes the scan can have in flight, its concurrency limit within the budget
+        # shared with other scans. Called with wanted equal to inflight, gives back the rest
+        wanted = self.control.limit if wanted is None else wanted
+        if self.scan.budget is None:
+            return wanted
+        self.held = self.scan.budget.hold(self.held,inflight,wanted)
+        return self.held
+
+    def wait(self,delay,limit):
+        # the seconds to wait with nothing in flight, for the rate limit or for the other scans
+        if delay > 0:
+            return delay
+        return Budget.WAIT if limit == 0 else 0
+
+    def getDelay(self):
+        # takes a token, or returns the seconds to wait before the next probe
+        bucket = self.getBucket()
+        return bucket.consume() if bucket is not None else 0
+
+    def nextTarget(self):
+        if self.scan.stopping.is_set():
+            return None
+        if self.scan.metrics is not None:
+            self.taken = monotonic()
+        if len(self.retries) > 0:
+            return self.retries.popleft()
+        return next(self.targets,None)
+
+    def getQueued(self):
+        # when the last target was taken, only measured with metrics
+        return self.taken if self.scan.metrics is not None else None
+
+    def setInflight(self,inflight):
+        if self.scan.metrics is not None:
+            self.scan.metrics.setInflight(inflight,self.control.limit)
+
+    def done(self,target):
+        self.control.success()
+        if len(self.attempts) > 0:
+            self.attempts.pop(target,None)
+
+    def retry(self,target,e):
+        # on resource errors the concurrency is lowered and the probe is queued again,
+        # any other error or too many attempts is reported as a task error.
+        # Only the errors that lower the concurrency count as an attempt
+        if Concurrency.isResourceError(e):
+            if self.scan.metrics is not None:
+                self.scan.metrics.retry(e)
+            attempts = self.attempts.get(target,0)
+            if self.control.failure():
+                attempts += 1
+            if attempts <= self.MAX_RETRIES:
+                self.attempts[target] = attempts
+                self.retries.append(target)
+                return True
+            self.attempts.pop(target,None)
+        self.scan.results.addTaskError(e)
+        return False
+
+    def createSocket(self,address,port_type):
+        socket_type = socket.SOCK_STREAM if port_type == Port.TCP else socket.SOCK_DGRAM
+        socket_family = socket.AF_INET if type(address) is IPv4Address else socket.AF_INET6
+        sock = socket.socket(socket_family, socket_type)
+        sock.setblocking(False)
+        return sock
+
+    @staticmethod
+    def names():
+        return [e.NAME for e in ENGINES]
+
+    @staticmethod
+    def getDefault(port_type):
+        return UdpEngine.NAME if port_type == Port.UDP else ThreadEngine.NAME
+
+    @staticmethod
+    def create(name,scan):
+        for e in ENGINES:
+            if e.NAME == name:
+                if scan.port.type not in e.TYPES:
+                    raise EngineException("The {} engine can't scan {} ports".format(name,scan.port.type))
+                return e(scan)
+        raise EngineException("Unknown engine {}".format(name))
+
+    @staticmethod
+    def getUdpResult(e):
+        # the ICMP port unreachable comes back as ECONNREFUSED on connected sockets,
+        # any other error leaves the port open or filtered
+        return errno.ECONNREFUSED if e.errno == errno.ECONNREFUSED else -1
+
+######################################################################################################
+class ThreadEngine(Engine):
+    NAME = 'thread'
+
+    def getConcurrency(self):
+        return self.getMaxConcurrency()
+
+    def getMaxConcurrency(self):
+        maximum = self.scan.getMaxWorkers()
+        for limit in (Limits.threads(),Engine.getMaxConcurrency(self)):
+            if limit is not None:
+                maximum = min(maximum,limit)
+        return maximum
+
+    def run(self):
+        self.prepare()
+        if self.scan.executor is not None:
+            # a pool shared with other scans, it stays up when the scan ends
+            self.execute(self.scan.executor)
+            return
+        if self.control.maximum == 1:
+            self.serial()
+            return
+        # imported by the engine that needs them, see AsyncEngine too
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.control.maximum) as executor:
+            self.execute(executor)
+
+    def serial(self):
+        # a single target (or -t 1) is probed in this thread, no pool is started
+        while True:
+            delay = self.getDelay()
+            if delay > 0:
+                sleep(delay)
+                continue
+            target = self.nextTarget()
+            if target is None:
+                break
+            self.setInflight(1)
+            try:
+                self.scan.collect(self.scan.task(*target,self.scan.port.type,self.getQueued()))
+                self.done(target)
+            except Exception as e:
+                self.retry(target,e)
+        self.setInflight(0)
+
+    def execute(self,executor):
+        # targets are submitted lazily, no more futures than the concurrency
+        # limit are pending at any time so memory does not grow with the target space
+        import concurrent.futures
+        pending = {}
+        exhausted = False
+        try:
+            while True:
+                # while the rate limit holds the next probe, the completed ones are collected
+                delay = 0
+                limit = self.hold(len(pending))
+                while len(pending) < limit:
+                    delay = self.getDelay()
+                    if delay > 0:
+                        break
+                    target = self.nextTarget()
+                    if target is None:
+                        exhausted = True
+                        break
+                    try:
+                        pending[executor.submit(self.scan.task,*target,self.scan.port.type,self.getQueued())] = target
+                    except RuntimeError as e:
+                        self.retry(target,e)
+                        break
+                self.hold(len(pending),len(pending))
+                self.setInflight(len(pending))
+                if len(pending) == 0:
+                    if exhausted and len(self.retries) == 0:
+                        break
+                    sleep(self.wait(delay,limit))
+                    continue
+                done,waiting = concurrent.futures.wait(pending,timeout=delay if delay > 0 else None,
+                                                       return_when=concurrent.futures.FIRST_COMPLETED)
+                for d in done:
+                    target = pending.pop(d)
+                    try:
+                        self.scan.collect(d.result())
+                        self.done(target)
+                    except Exception as e:
+                        self.retry(target,e)
+        finally:
+            self.hold(0,0)
+
+######################################################################################################
+class AsyncEngine(Engine):
+    NAME = 'async'
+
+    def run(self):
+        # asyncio is the slowest module to import, only this engine loads it
+        import asyncio
+        if self.scan.loop is not None:
+            # an event loop shared with other scans, running in its own thread
+            asyncio.run_coroutine_threadsafe(self.main(),self.scan.loop).result()
+            return
+        asyncio.run(self.main())
+
+    async def main(self):
+        import asyncio
+        self.prepare()
+        tasks = set()
+        exhausted = False
+        try:
+            while True:
+                # while the rate limit holds the next probe, the completed ones are collected
+                delay = 0
+                limit = self.hold(len(tasks))
+                while len(tasks) < limit:
+                    delay = self.getDelay()
+                    if delay > 0:
+                        break
+                    target = self.nextTarget()
+                    if target is None:
+                        exhausted = True
+                        break
+                    tasks.add(asyncio.ensure_future(self.probe(target,self.getQueued())))
+                self.hold(len(tasks),len(tasks))
+                self.setInflight(len(tasks))
+                if len(tasks) == 0:
+                    if exhausted and len(self.retries) == 0:
+                        break
+                    await asyncio.sleep(self.wait(delay,limit))
+                    continue
+                done,tasks = await asyncio.wait(tasks,timeout=delay if delay > 0 else None,return_when=asyncio.FIRST_COMPLETED)
+                for d in done:
+                    target,item,e = d.result()
+                    if e is None:
+                        self.scan.collect(item)
+                        self.done(target)
+                    else:
+                        self.retry(target,e)
+        finally:
+            self.hold(0,0)
+
+    async def probe(self,target,queued=None):
+        try:
+            return target,await self.task(*target,self.scan.port.type,queued),None
+        except Exception as e:
+            return target,None,e
+
+    async def task(self,address,port,port_type,queued=None):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        with self.createSocket(address,port_type) as sock:
+            r = -1
+            timeout = self.scan.getTimeout(address)
+            start = monotonic()
+            if queued is not None:
+                self.scan.metrics.queued(start - queued)
+            try:
+                if port_type == Port.TCP:
+                    await asyncio.wait_for(loop.sock_connect(sock,(str(address),port)),timeout)
+                    r = 0
+                    self.scan.handoff(address,port,sock)
+                else:
+                    await loop.sock_connect(sock,(str(address),port))
+                    await loop.sock_sendall(sock,self.scan.getDataPacket(str(address),port))
+                    await asyncio.wait_for(loop.sock_recv(sock,1024),timeout)
+                    r = 0
+            except asyncio.TimeoutError:
+                # same code connect_ex returns when a blocking connect times out
+                r = errno.EAGAIN if port_type == Port.TCP else -1
+            except OSError as e:
+                if Concurrency.isResourceError(e):
+                    raise
+                if port_type == Port.TCP:
+                    r = e.errno if e.errno else -1
+                else:
+                    r = self.getUdpResult(e)
+            self.scan.observe(address,port_type,r,monotonic() - start)
+            return self.scan.makeResult(address,port,port_type,r)
+
+######################################################################################################
+class TimerWheel:
+    RESOLUTION = 0.01
+    SLOTS = 512
+
+    def __init__(self,resolution=RESOLUTION,slots=SLOTS) -> None:
+        self.resolution = resolution
+        self.slots = [dict() for n in range(slots)]
+        self.tick = self.getTick(monotonic())
+
+    def getTick(self,timestamp):
+        return int(timestamp / self.resolution)
+
+    def getDeadlineTick(self,deadline):
+        # rounded up, a key never expires before its deadline
+        return max(self.getTick(deadline) + 1,self.tick)
+
+    def add(self,key,deadline):
+        tick = self.getDeadlineTick(deadline)
+        self.slots[tick % len(self.slots)][key] = tick
+
+    def remove(self,key,deadline):
+        tick = self.getDeadlineTick(deadline)
+        self.slots[tick % len(self.slots)].pop(key,None)
+
+    def expire(self,now):
+        # walks every slot between the last tick and now, a key is expired
+        # only when its tick is reached, keys of later rounds stay in place
+        expired = []
+        current = self.getTick(now)
+        for tick in range(self.tick,min(current,self.tick + len(self.slots) - 1) + 1):
+            slot = self.slots[tick % len(self.slots)]
+            for key in [k for k,t in slot.items() if t <= current]:
+                del slot[key]
+                expired.append(key)
+        self.tick = current
+        return expired
+
+######################################################################################################
+class SelectorEngine(Engine):
+    NAME = 'select'
+    BATCH_SIZE = 256
+
+    def run(self):
+        self.prepare()
+        self.selector = selectors.DefaultSelector()
+        self.wheel = TimerWheel()
+        self.pending = {}
+        exhausted = False
+        try:
+            while True:
+                batch = 0
+                delay = 0
+                limit = self.hold(len(self.pending))
+                while len(self.pending) < limit and batch < self.BATCH_SIZE:
+                    delay = self.getDelay()
+                    if delay > 0:
+                        break
+                    target = self.nextTarget()
+                    if target is None:
+                        exhausted = True
+                        break
+                    if not self.open(target):
+                        break
+                    batch += 1
+                self.hold(len(self.pending),len(self.pending))
+                self.setInflight(len(self.pending))
+                if len(self.pending) == 0:
+                    if exhausted and len(self.retries) == 0:
+                        break
+                    # nothing to poll, wait for the rate limit or the other scans,
+                    # a probe queued again is sent at once
+                    sleep(self.wait(delay,limit))
+                    continue
+                wait = min(self.wheel.resolution,delay) if delay > 0 else self.wheel.resolution
+                for key,mask in self.selector.select(wait):
+                    self.complete(key.fileobj)
+                for sock in self.wheel.expire(monotonic()):
+                    self.expire(sock)
+        finally:
+            self.hold(0,0)
+            for sock in self.pending:
+                sock.close()
+            self.selector.close()
+
+    def open(self,target):
+        # returns False when the probe was queued again,
+        # the batch stops until some of the pending probes complete
+        address,port = target
+        port_type = self.scan.port.type
+        try:
+            sock = self.createSocket(address,port_type)
+        except Exception as e:
+            return not self.retry(target,e)
+        try:
+            start = monotonic()
+            if self.scan.metrics is not None:
+                self.scan.metrics.queued(start - self.taken)
+            if port_type == Port.TCP:
+                r = sock.connect_ex((str(address),port))
+                if Concurrency.isResourceError(r):
+                    raise OSError(r,os.strerror(r))
+                if r not in (errno.EINPROGRESS,errno.EWOULDBLOCK,errno.EAGAIN):
+                    if r == 0:
+                        self.scan.handoff(address,port,sock)
+                    sock.close()
+                    self.scan.collect(self.scan.makeResult(address,port,port_type,r))
+                    self.done(target)
+                    return True
+                events = selectors.EVENT_WRITE
+            else:
+                sock.connect((str(address),port))
+                sock.send(self.scan.getDataPacket(str(address),port))
+                events = selectors.EVENT_READ
+            deadline = start + self.scan.getTimeout(address)
+            self.selector.register(sock,events)
+            self.wheel.add(sock,deadline)
+            self.pending[sock] = (target,start,deadline)
+        except Exception as e:
+            sock.close()
+            if port_type == Port.TCP or Concurrency.isResourceError(e):
+                return not self.retry(target,e)
+            self.scan.collect(self.scan.makeResult(address,port,port_type,self.getUdpResult(e)))
+            self.done(target)
+        return True
+
+    def complete(self,sock):
+        if self.scan.port.type == Port.TCP:
+            r = sock.getsockopt(socket.SOL_SOCKET,socket.SO_ERROR)
+        else:
+            try:
+                sock.recv(1024)
+                r = 0
+            except OSError as e:
+                r = self.getUdpResult(e)
+        target,start,deadline = self.pending[sock]
+        self.wheel.remove(sock,deadline)
+        self.scan.observe(target[0],self.scan.port.type,r,monotonic() - start)
+        self.close(sock,r)
+
+    def expire(self,sock):
+        # a timeout is observed as well, as the thread and async engines do
+        target,start,deadline = self.pending[sock]
+        r = errno.EAGAIN if self.scan.port.type == Port.TCP else -1
+        self.scan.observe(target[0],self.scan.port.type,r,monotonic() - start)
+        self.close(sock,r)
+
+    def close(self,sock,r):
+        target,start,deadline = self.pending.pop(sock)
+        self.selector.unregister(sock)
+        if r == 0 and self.scan.port.type == Port.TCP:
+            self.scan.handoff(*target,sock)
+        sock.close()
+        self.scan.collect(self.scan.makeResult(*target,self.scan.port.type,r))
+        self.done(target)
+
+######################################################################################################
+class UdpEngine(Engine):
+    NAME = 'udp'
+    TYPES = (Port.UDP,)
+    DEFAULT_CONCURRENCY = 256
+    MAX_CONCURRENCY = 1024
+    RATE = 1000
+    RETRANSMISSIONS = 1
+    DRAIN = 64
+    PARKED = 4096
+
+    def getBucket(self):
+        # without --rate the sends are still paced, each host is paced on its own as well, see HostPacing
+        if self.scan.bucket is None:
+            self.scan.bucket = TokenBucket(self.RATE)
+        return self.scan.bucket
+
+    def run(self):
+        # a pool of connected UDP sockets, each one connected again to the next target
+        # once its probe is over. Replies and ICMP errors are read through a selector
+        self.prepare()
+        self.selector = selectors.DefaultSelector()
+        self.wheel = TimerWheel()
+        self.pending = {}
+        self.idle = {socket.AF_INET:[],socket.AF_INET6:[]}
+        self.pacing = HostPacing()
+        # the targets waiting for the time booked on their host, the earliest first
+        self.parked = []
+        self.order = itertools.count()
+        self.exhausted = False
+        try:
+            while True:
+                delay = 0
+                limit = self.hold(len(self.pending))
+                while len(self.pending) < limit:
+                    delay = self.getDelay()
+                    if delay > 0:
+                        break
+                    target = self.nextReady()
+                    if target is None:
+                        break
+                    if not self.send(target):
+                        break
+                self.hold(len(self.pending),len(self.pending))
+                self.setInflight(len(self.pending))
+                if len(self.pending) == 0:
+                    if self.exhausted and len(self.retries) == 0 and len(self.parked) == 0:
+                        break
+                    if delay == 0 and len(self.parked) > 0:
+                        delay = max(0,self.parked[0][0] - monotonic())
+                    sleep(self.wait(delay,limit))
+                    continue
+                wait = min(self.wheel.resolution,delay) if delay > 0 else self.wheel.resolution
+                for key,mask in self.selector.select(wait):
+                    self.complete(key.fileobj)
+                for sock in self.wheel.expire(monotonic()):
+                    self.expire(sock)
+        finally:
+            self.hold(0,0)
+            for sock in self.pending:
+                sock.close()
+            for sockets in self.idle.values():
+                for sock in sockets:
+                    sock.close()
+            self.selector.close()
+
+    def nextReady(self):
+        # the parked targets whose time has come first, then the next ones,
+        # parked in turn when their host has been probed too recently
+        now = monotonic()
+        if self.scan.stopping.is_set():
+            # the targets not sent are left to the checkpoint, as the ones not taken
+            self.parked = []
+        while True:
+            if len(self.parked) > 0 and self.parked[0][0] <= now:
+                at,n,target,taken = heapq.heappop(self.parked)
+                self.taken = taken
+                return target
+            if self.exhausted or len(self.parked) >= self.PARKED:
+                return None
+            target = self.nextTarget()
+            if target is None:
+                self.exhausted = True
+                return None
+            at = self.pacing.reserve(target[0],now)
+            if at <= now:
+                return target
+            heapq.heappush(self.parked,(at,next(self.order),target,self.getQueued()))
+
+    def getSocket(self,address):
+        family = socket.AF_INET if type(address) is IPv4Address else socket.AF_INET6
+        if len(self.idle[family]) > 0:
+            return self.idle[family].pop()
+        return self.createSocket(address,Port.UDP)
+
+    def send(self,target):
+        # returns False when the probe was queued again
+        address,port = target
+        try:
+            sock = self.getSocket(address)
+        except Exception as e:
+            return not self.retry(target,e)
+        try:
+            sock.connect((str(address),port))
+            self.drain(sock)
+            sock.send(self.scan.getDataPacket(str(address),port))
+        except Exception as e:
+            sock.close()
+            if Concurrency.isResourceError(e):
+                return not self.retry(target,e)
+            self.scan.collect(self.scan.makeResult(address,port,Port.UDP,self.getUdpResult(e)))
+            self.done(target)
+            return True
+        start = monotonic()
+        if self.scan.metrics is not None:
+            self.scan.metrics.queued(start - self.taken)
+        deadline = start + self.scan.getTimeout(address)
+        self.selector.register(sock,selectors.EVENT_READ)
+        self.wheel.add(sock,deadline)
+        self.pending[sock] = [target,start,deadline,self.RETRANSMISSIONS,False]
+        return True
+
+    def drain(self,sock):
+        # a socket connected again still holds the late replies and the pending ICMP error
+        # of its previous target, they would be read as the answer of the next one.
+        # Once connected to the new target nothing more comes from the previous one
+        for n in range(self.DRAIN):
+            try:
+                sock.recv(1024)
+            except BlockingIOError:
+                break
+            except OSError:
+                pass
+        sock.getsockopt(socket.SOL_SOCKET,socket.SO_ERROR)
+
+    def expire(self,sock):
+        # a lost datagram or a rate limited ICMP look like a filtered port, send it once more
+        # when the host can be probed again. Until then the socket waits with the time booked
+        target,start,deadline,retransmissions,waiting = self.pending[sock]
+        now = monotonic()
+        if not waiting:
+            self.pacing.lost(target[0])
+        if retransmissions > 0:
+            at = now if waiting else self.pacing.reserve(target[0],now)
+            if at > now:
+                self.wheel.add(sock,at)
+                self.pending[sock] = [target,start,at,retransmissions,True]
+                return
+            try:
+                sock.send(self.scan.getDataPacket(str(target[0]),target[1]))
+                deadline = now + self.scan.getTimeout(target[0])
+                self.wheel.add(sock,deadline)
+                self.pending[sock] = [target,start,deadline,retransmissions - 1,False]
+                return
+            except OSError as e:
+                r = self.getUdpResult(e)
+                self.scan.observe(target[0],Port.UDP,r,monotonic() - start)
+                self.release(sock,r)
+                return
+        self.scan.observe(target[0],Port.UDP,-1,monotonic() - start)
+        self.release(sock,-1)
+
+    def complete(self,sock):
+        target,start,deadline,retransmissions,waiting = self.pending[sock]
+        try:
+            sock.recv(1024)
+            r = 0
+        except OSError as e:
+            r = self.getUdpResult(e)
+        self.wheel.remove(sock,deadline)
+        if r != -1:
+            self.pacing.answered(target[0],r == errno.ECONNREFUSED)
+        if retransmissions == self.RETRANSMISSIONS:
+            self.scan.observe(target[0],Port.UDP,r,monotonic() - start)
+        elif self.scan.metrics is not None:
+            # the answer of a datagram sent again is no round-trip time sample, it is still a probe
+            self.scan.metrics.observe(r,monotonic() - start)
+        self.release(sock,r)
+
+    def release(self,sock,r):
+        target,start,deadline,retransmissions,waiting = self.pending.pop(sock)
+        self.selector.unregister(sock)
+        self.idle[sock.family].append(sock)
+        self.scan.collect(self.scan.makeResult(*target,Port.UDP,r))
+        self.done(target)
+
+######################################################################################################
+ENGINES = [ThreadEngine,AsyncEngine,SelectorEngine,UdpEngine]
@@ -0,0 +1,53 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+
+# The ports most often found open, from the most to the least frequent.
+# Loaded on demand by PortFrequency, the ports missing here follow in numeric order
+
+TCP = (
+    80,23,443,21,22,25,3389,110,445,139,143,53,135,3306,8080,1723,111,995,993,5900,
+    1025,587,8888,199,1720,465,548,113,81,6001,10000,514,5060,179,1026,2000,8443,8000,32768,554,
+    26,1433,49152,2001,515,8008,49154,1027,5666,646,5000,5631,631,49153,8081,2049,88,79,5800,106,
+    2121,1110,49155,6000,513,990,5357,427,49156,543,544,5101,144,7,389,8009,3128,444,9999,5009,
+    7070,5190,3000,5432,1900,3986,13,1029,9,5051,6646,49157,1028,873,1755,2717,4899,9100,119,37,
+    1000,3001,5001,82,10010,1030,9090,2107,1024,2103,6004,1801,5050,19,8031,1041,255,1048,1049,1053,
+    1054,1056,1064,1065,2967,3703,17,808,3689,1031,1044,1071,5901,100,9102,8010,2869,1039,5120,4001,
+    9000,2105,636,1038,2601,1,7000,1066,1069,625,311,280,254,4000,1761,5003,2002,2005,1998,1032,
+    1050,6112,3690,1521,2161,6002,1080,2401,4045,902,7937,787,1058,2383,32771,1033,1040,1059,50000,5555,
+    10001,1494,593,2301,3,3268,7938,1234,1022,1074,8002,1036,1035,9001,1037,464,497,1935,6666,
+    2003,6543,1352,24,3269,1111,407,500,20,2006,3260,15000,1218,1034,4444,264,2004,33,1042,42510,
+    999,3052,1023,1068,222,7100,888,563,1717,2008,992,32770,7001,32772,2007,8082,5550,2009,5801,1043,
+    512,2701,7019,50001,1700,4662,2065,2010,42,9535,2602,3333,161,5100,5002,2604,4002,6059,1047,8192,
+    8193,2702,6789,9595,1051,9594,9593,16993,16992,5226,5225,32769,3283,1052,8194,1055,1062,9415,8701,8652,
+    8651,8089,65389,65000,64680,64623,55600,55555,52869,35500,33354,23502,20828,1311,1060,4443,1067,13782,5902,366,
+    9050,1002,85,5500,5431,1864,1863,8085,51103,49999,45100,10243,49,6667,90,27000,1503,6881,1500,8021,
+    340,5566,8088,2222,9071,8899,6005,9876,1501,5102,32774,32773,9101,5679,163,648,146,1666,901,83,
+    9207,8001,8083,5004,3476,8084,5214,14238,12345,912,30,2605,2030,6,541,8007,3005,4,1248,2500,
+    880,306,4242,1097,9009,2525,1086,1088,8291,52822,6101,900,7200,2809,800,32775,12000,1083,211,987,
+)
+
+UDP = (
+    631,161,137,123,138,1434,445,135,67,53,139,500,68,520,1900,4500,514,49152,162,69,
+    5353,111,49154,1701,998,996,997,999,3283,49153,1812,136,2222,2049,32768,5060,1025,1433,3456,80,
+    20031,1026,1027,1028,1029,1030,1031,1032,1033,1034,1035,1036,1037,1038,1039,1040,1041,1042,1043,1044,
+    1045,1046,1047,1048,1049,1050,1051,1052,1053,1054,1055,1056,1057,1058,1059,1060,1061,1062,1063,1064,
+    1065,1066,1067,1068,1069,1070,1071,1072,1073,1074,1075,1076,1077,1078,1079,1080,1081,1082,1083,1084,
+    177,1813,1719,427,443,5632,3702,33281,1645,1646,623,626,49,1718,5355,2048,4444,6001,9200,17185,
+    19283,10000,7,9,13,17,19,37,42,88,389,464,517,518,1194,3389,5000,11211,27015,
+)
@@ -17,15 +17,66 @@
 # ----------------------------------------------------------------------------------------
 
 import ipaddress
-import socket
+from rnps.resolver import Resolver
+
+class HostException(Exception):
+
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
 
 class Host:
     def __init__(self,address) -> None:
         try:
             self.address = ipaddress.ip_interface(address)
-        except Exception as e:
+        except ValueError:
+            # the first address of the name, IPv4 first
+            addresses = Resolver.getDefault().lookup(address)
+            addresses = sorted(addresses,key=lambda a: a.version)
+            self.address = ipaddress.ip_interface(addresses[0])
+
+class Hosts:
+    # many targets : addresses, networks in CIDR notation and hostnames,
+    # the hostnames resolved at once with every address they have.
+    # A single address or network is scanned as a Host alone, anything
+    # else becomes a list of addresses without duplicates
+    MAX_ADDRESSES = 1 << 20
+
+    def __init__(self,targets,resolver=None) -> None:
+        self.targets = list(targets)
+        self.resolver = resolver if resolver is not None else Resolver.getDefault()
+        self.errors = []
+        self.host = None
+        self.addresses = None
+        self.resolve()
+
+    def resolve(self):
+        if len(self.targets) == 0:
+            raise HostException("No targets to scan")
+        networks = {}
+        names = []
+        for target in self.targets:
             try:
-                address = socket.gethostbyname(address)
-                self.address = ipaddress.ip_interface(address)
-            except Exception as e:
-                raise e
\ No newline at end of file
+                networks[target] = ipaddress.ip_interface(target)
+            except ValueError:
+                names.append(target)
+        resolved,errors = self.resolver.resolve(names)
+        self.errors = [errors[name] for name in names if name in errors]
+        if len(self.targets) == 1 and len(networks) == 1:
+            self.host = Host(self.targets[0])
+            return
+        addresses = {}
+        for target in self.targets:
+            if target in networks:
+                interface = networks[target]
+                hosts = [interface.ip] if interface.network.prefixlen == interface.max_prefixlen else interface.network.hosts()
+                for address in hosts:
+                    addresses[address] = True
+                    if len(addresses) > self.MAX_ADDRESSES:
+                        raise HostException("Too many addresses, more than {}. Scan large networks one at a time".format(self.MAX_ADDRESSES))
+            else:
+                for address in resolved.get(target,[]):
+                    addresses[address] = True
+        if len(addresses) == 0:
+            raise self.errors[0] if len(self.errors) > 0 else HostException("No addresses to scan")
+        self.addresses = list(addresses)
+        self.host = Host(str(self.addresses[0]))
\ No newline at end of file
@@ -0,0 +1,122 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+
+import errno
+from threading import Lock
+from time import monotonic
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class Limits:
+    RESERVED = 64
+
+    @staticmethod
+    def getLimit(name):
+        if resource is None or not hasattr(resource,name):
+            return None
+        soft,hard = resource.getrlimit(getattr(resource,name))
+        return None if soft == resource.RLIM_INFINITY else soft
+
+    @staticmethod
+    def raiseOpenFiles(wanted):
+        # the soft limit can be raised up to the hard one without privileges
+        if resource is None:
+            return
+        try:
+            soft,hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            if soft == resource.RLIM_INFINITY:
+                return
+            wanted = wanted + Limits.RESERVED
+            if hard != resource.RLIM_INFINITY:
+                wanted = min(wanted,hard)
+            if wanted > soft:
+                resource.setrlimit(resource.RLIMIT_NOFILE,(wanted,hard))
+        except (ValueError,OSError):
+            pass
+
+    @staticmethod
+    def openFiles():
+        limit = Limits.getLimit('RLIMIT_NOFILE')
+        return None if limit is None else max(1,limit - Limits.RESERVED)
+
+    @staticmethod
+    def threads():
+        limit = Limits.getLimit('RLIMIT_NPROC')
+        return None if limit is None else max(1,limit - Limits.RESERVED)
+
+class Concurrency:
+    RESOURCE_ERRORS = {errno.EMFILE,errno.ENFILE,errno.ENOBUFS,errno.ENOMEM,errno.EADDRNOTAVAIL}
+    DECREASE = 0.5
+    STEPS = 64
+    COOLDOWN = 0.1
+
+    def __init__(self,maximum,initial=None) -> None:
+        self.maximum = max(1,maximum)
+        self.limit = max(1,min(initial,self.maximum)) if initial is not None else self.maximum
+        self.step = max(1,self.maximum // self.STEPS)
+        self.successes = 0
+        self.decreased = 0
+
+    @staticmethod
+    def isResourceError(e):
+        if isinstance(e,int):
+            return e in Concurrency.RESOURCE_ERRORS
+        if isinstance(e,OSError):
+            return e.errno in Concurrency.RESOURCE_ERRORS
+        # raised by threading when a new thread can't be started
+        return isinstance(e,RuntimeError) and "thread" in str(e)
+
+    def success(self):
+        # additive increase, one step every time a full window completes
+        self.successes += 1
+        if self.successes >= self.limit:
+            self.successes = 0
+            self.limit = min(self.maximum,self.limit + self.step)
+
+    def failure(self):
+        # multiplicative decrease, once per cooldown since a burst of
+        # errors comes from the same overload. Returns False when the
+        # error falls in the cooldown of a previous one
+        now = monotonic()
+        if now - self.decreased < self.COOLDOWN:
+            return False
+        self.decreased = now
+        self.successes = 0
+        self.limit = max(1,int(self.limit * self.DECREASE))
+        return True
+
+class Budget:
+    # the probes in flight of all the scans sharing it, see Scanner.
+    # Each scan holds some of them and gives back the ones it doesn't use
+    WAIT = 0.01
+
+    def __init__(self,maximum) -> None:
+        self.maximum = max(1,maximum)
+        self.used = 0
+        self.lock = Lock()
+
+    def hold(self,held,inflight,wanted):
+        # returns the probes a scan can have in flight, never fewer than the ones already sent
+        with self.lock:
+            self.used -= held
+            granted = max(inflight,min(wanted,self.maximum - self.used))
+            self.used += granted
+            return granted
@@ -0,0 +1,203 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+from bisect import bisect_left
+import errno
+from threading import Lock
+
+class Histogram:
+    # cumulative buckets as in the Prometheus histograms, upper bounds in seconds
+    BUCKETS = (0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10)
+
+    def __init__(self,buckets=BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def add(self,value):
+        self.counts[bisect_left(self.buckets,value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self,other):
+        self.counts = [a + b for a,b in zip(self.counts,other["counts"])]
+        self.sum += other["sum"]
+        self.count += other["count"]
+
+    def toDict(self):
+        return {"buckets":list(self.buckets),"counts":list(self.counts),"sum":self.sum,"count":self.count}
+
+class Metrics:
+    # instrumentation of the probes, shared by the scan and its engine.
+    # A hook is called as hook(name,value,labels) on every observation,
+    # the hooks are not sent to the processes of a --processes scan
+    PROMETHEUS = "prometheus"
+    JSON = "json"
+    FORMATS = [PROMETHEUS,JSON]
+    PREFIX = "rnps_"
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.hooks = []
+        self.probes = {}
+        self.errors = {}
+        self.retries = {}
+        self.latency = {}
+        self.wait = Histogram()
+        self.inflight = 0
+        self.peak = 0
+        self.limit = 0
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self,state):
+        self.__init__()
+
+    def addHook(self,hook):
+        self.hooks.append(hook)
+
+    def removeHook(self,hook):
+        self.hooks.remove(hook)
+
+    def notify(self,name,value,labels=None):
+        for hook in self.hooks:
+            hook(name,value,labels if labels is not None else {})
+
+    @staticmethod
+    def classify(r):
+        if r == 0:
+            return "open"
+        if r == errno.ECONNREFUSED:
+            return "closed"
+        if r == errno.EAGAIN or r == -1:
+            # timed out, or no answer to a UDP probe
+            return "filtered"
+        return "error"
+
+    @staticmethod
+    def errorName(code):
+        return errno.errorcode.get(code,str(code))
+
+    def queued(self,elapsed):
+        # from the target leaving the targets iterator to the probe being sent
+        with self.lock:
+            self.wait.add(elapsed)
+        if self.hooks:
+            self.notify("queue_wait_seconds",elapsed)
+
+    def observe(self,r,elapsed):
+        state = self.classify(r)
+        with self.lock:
+            if state not in self.latency:
+                self.latency[state] = Histogram()
+            self.latency[state].add(elapsed)
+        if self.hooks:
+            self.notify("probe_latency_seconds",elapsed,{"result":state})
+
+    def result(self,r):
+        state = self.classify(r)
+        with self.lock:
+            self.probes[state] = self.probes.get(state,0) + 1
+            if state == "error":
+                name = self.errorName(r)
+                self.errors[name] = self.errors.get(name,0) + 1
+        if self.hooks:
+            self.notify("probes_total",1,{"result":state})
+
+    def retry(self,e):
+        name = self.errorName(e.errno) if getattr(e,"errno",None) is not None else type(e).__name__
+        with self.lock:
+            self.retries[name] = self.retries.get(name,0) + 1
+        if self.hooks:
+            self.notify("retries_total",1,{"error":name})
+
+    def setInflight(self,inflight,limit):
+        # sampled by the engines every time probes are sent
+        self.inflight = inflight
+        self.peak = max(self.peak,inflight)
+        self.limit = limit
+        if self.hooks:
+            self.notify("inflight",inflight)
+
+    def merge(self,state):
+        with self.lock:
+            for key in ("probes","errors","retries"):
+                counters = getattr(self,key)
+                for name,value in state[key].items():
+                    counters[name] = counters.get(name,0) + value
+            for name,histogram in state["latency"].items():
+                self.latency.setdefault(name,Histogram()).merge(histogram)
+            self.wait.merge(state["queue_wait"])
+            self.peak = max(self.peak,state["inflight"]["peak"])
+            self.limit = max(self.limit,state["inflight"]["limit"])
+
+    def toDict(self):
+        with self.lock:
+            return {
+                "probes":dict(self.probes),
+                "errors":dict(self.errors),
+                "retries":dict(self.retries),
+                "latency":{name:h.toDict() for name,h in self.latency.items()},
+                "queue_wait":self.wait.toDict(),
+                "inflight":{"current":self.inflight,"peak":self.peak,"limit":self.limit},
+            }
+
+    def toPrometheus(self):
+        state = self.toDict()
+        lines = []
+
+        def metric(name,kind,text):
+            lines.append(f"# HELP {self.PREFIX}{name} {text}")
+            lines.append(f"# TYPE {self.PREFIX}{name} {kind}")
+
+        def histogram(name,h,labels=""):
+            total = 0
+            for bound,count in zip(h["buckets"],h["counts"]):
+                total += count
+                lines.append(f'{self.PREFIX}{name}_bucket{{{labels}le="{bound}"}} {total}')
+            lines.append(f'{self.PREFIX}{name}_bucket{{{labels}le="+Inf"}} {h["count"]}')
+            labels = "{" + labels.rstrip(",") + "}" if labels else ""
+            lines.append(f'{self.PREFIX}{name}_sum{labels} {h["sum"]}')
+            lines.append(f'{self.PREFIX}{name}_count{labels} {h["count"]}')
+
+        metric("probes_total","counter","Probes completed, by result")
+        for name,value in sorted(state["probes"].items()):
+            lines.append(f'{self.PREFIX}probes_total{{result="{name}"}} {value}')
+        metric("errors_total","counter","Probes failed, by errno")
+        for name,value in sorted(state["errors"].items()):
+            lines.append(f'{self.PREFIX}errors_total{{errno="{name}"}} {value}')
+        metric("retries_total","counter","Probes queued again after a resource error, by errno")
+        for name,value in sorted(state["retries"].items()):
+            lines.append(f'{self.PREFIX}retries_total{{errno="{name}"}} {value}')
+        metric("probe_latency_seconds","histogram","Time from the probe being sent to its answer or timeout, by result")
+        for name,h in sorted(state["latency"].items()):
+            histogram("probe_latency_seconds",h,f'result="{name}",')
+        metric("queue_wait_seconds","histogram","Time from a target being taken to its probe being sent")
+        histogram("queue_wait_seconds",state["queue_wait"])
+        for name,text in (("current","Probes in flight"),("peak","Most probes in flight at once"),("limit","Probes allowed in flight")):
+            metric(f"inflight_{name}","gauge",text)
+            lines.append(f'{self.PREFIX}inflight_{name} {state["inflight"][name]}')
+        return "\n".join(lines) + "\n"
+
+    def save(self,filename,format=PROMETHEUS):
+        import json
+        content = json.dumps(self.toDict(),indent=2) + "\n" if format == self.JSON else self.toPrometheus()
+        with open(filename,"w") as f:
+            f.write(content)
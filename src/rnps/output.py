@@ -16,10 +16,9 @@
 # along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
 # ----------------------------------------------------------------------------------------
 
-from datetime import datetime
-import json
+import errno
 import sys
-from typing import Any
+from rnps.port import Port, PortService
 from rnps.validator import Validator
 from rnps.version import Version
 
@@ -30,6 +29,8 @@ class Output:
                 ) -> None:
         self.validator = validator
         self.result = None
+        # the result sent before, the quick rescan of a baseline when the full sweep follows
+        self.previous = None
 
     def setResult(self,result):
         self.result = result
@@ -38,11 +39,15 @@ class Output:
         return f"RNPS ver {Version.MAJOR}.{Version.MINOR}.{Version.PATCH}\n"
     
     def startTimestamp(self,timestamp) -> str:
+        from datetime import datetime
         return f"Scan started at {datetime.fromtimestamp(timestamp)}\n"
 
     def elapsedTimestamp(self,timestamp) -> str:
         return f"Scan performed in {round(timestamp,2)} seconds\n"
 
+    def discoveryStats(self,total,alive) -> str:
+        return f"Hosts up {alive} (of {total}), the others were skipped\n"
+
     def hostHeader(self,host,total_of,total,tot_done,tot_not_done):
         return f"\nHost {host}\nTotal ports scanned {total} (of {total_of}), not open {tot_not_done}, open {tot_done}\n"
 
@@ -52,6 +57,10 @@ class Output:
     def stats(self):
         content = self.startTimestamp(self.result["timestamps"]["start"])
         content += self.elapsedTimestamp(self.result["timestamps"]["elapsed"])
+        if "discovery" in self.result:
+            content += self.discoveryStats(self.result["discovery"]["total"],self.result["discovery"]["alive"])
+        if "diff" in self.result:
+            return content + self.diffTable()
         for host in self.result["hosts"]:
             total_of = len(self.validator.getArgs().getPorts())
             total = total_of - len(self.result["errors"]["task"])
@@ -77,24 +86,89 @@ class Output:
         line = self.line(len(header))
         return line + header + line
 
+    def portState(self,port):
+        if port["result"] == 0:
+            return "open"
+        if port["port_type"] == Port.UDP:
+            return "closed" if port["result"] == errno.ECONNREFUSED else "open|filtered"
+        return port["result"]
+
     def portTableRow(self,port):
-        return self.portTableTabulation().format(port["port"],port["port_type"],"open" if port["result"] == 0 else port["result"],port["service"])
+        return self.portTableTabulation().format(port["port"],port["port_type"],self.portState(port),port["service"])
 
     def portTable(self,host):
         ports = self.result["hosts"][host]
-        table = self.portTableHeader()
+        banners = self.result.get("banners",{}).get(host)
+        table = self.portTableHeader() if banners is None else self.bannerTableHeader()
         for port in ports:
             if port["result"] != 0 and not self.validator.verbose():
                 continue
-            table += self.portTableRow(port)
+            if banners is None:
+                table += self.portTableRow(port)
+            else:
+                table += self.bannerTableRow(port,banners.get(port["port"]))
         return table
 
+    def bannerTableTabulation(self):
+        return "{:<7} {:<5} {:<6} {:<15} {}\n"
+
+    def bannerTableHeader(self):
+        header = self.bannerTableTabulation().format("PORT","TYPE","STATE","SERVICE","BANNER")
+        line = self.line(len(header) + 40)
+        return line + header + line
+
+    def bannerTableRow(self,port,banner):
+        # the service fingerprinted replaces the one guessed from the port number
+        service,text = port["service"],""
+        if banner is not None:
+            service,text = banner["service"],banner["banner"]
+        return self.bannerTableTabulation().format(port["port"],port["port_type"],self.portState(port),service,text)
+
+    def diffTableTabulation(self):
+        return "{:<39} {:<7} {:<7} {:<7}\n"
+
+    def diffTable(self):
+        opened = self.result["diff"]["opened"]
+        closed = self.result["diff"]["closed"]
+        content = f"\nChanges since the baseline, newly opened {len(opened)}, newly closed {len(closed)}\n"
+        if len(opened) + len(closed) == 0:
+            return content
+        header = self.diffTableTabulation().format("HOST","PORT","STATE","SERVICE")
+        content += self.line(len(header)) + header + self.line(len(header))
+        port_type = self.validator.getArgs().getPortType()
+        for state,ports in (("opened",opened),("closed",closed)):
+            for port in ports:
+                service = PortService.getServiceName(port["port"],port_type)
+                content += self.diffTableTabulation().format(port["host"],port["port"],state,service)
+        return content
+
     def toJSON(self):
+        import json
         content = self.result
         content["name"] = "RNPS (Rapid Network Port Scan)"
         content["version"] = f"{Version.MAJOR}.{Version.MINOR}.{Version.PATCH}"
         content["cmdline"] = self.validator.getArgs().getCmdLine()
-        return json.dumps(content,indent=4)
+        if self.previous is not None and "diff" in self.previous:
+            # the file of the full sweep keeps the changes found by the quick rescan
+            content["quick"] = {"timestamps":self.previous["timestamps"],"diff":self.previous["diff"]}
+        # the ports of each host are turned into a list only while being encoded
+        return json.dumps(content,indent=4,default=lambda o: o.toList())
+
+    def toNDJSONSummary(self):
+        streamed = self.result.get("streamed",{"probes":0,"open":0})
+        return {
+            "type":"summary",
+            "name":"RNPS (Rapid Network Port Scan)",
+            "version":f"{Version.MAJOR}.{Version.MINOR}.{Version.PATCH}",
+            "cmdline":self.validator.getArgs().getCmdLine(),
+            "timestamps":self.result["timestamps"],
+            "hosts":len(self.result["hosts"]),
+            "probes":streamed["probes"],
+            "open":streamed["open"],
+            "discovery":self.result.get("discovery"),
+            "diff":self.result.get("diff"),
+            "errors":self.result["errors"],
+        }
 
     def checkForErrors(self):
         tot_main_errs = len(self.result["errors"]["main"])
@@ -120,14 +194,33 @@ class Output:
     def send(self):
         if self.result is None:
             return
+        if self.validator.ndjson():
+            self.sendSummary()
+            self.previous = self.result
+            return
         content = self.toJSON() if self.validator.json() else self.stats()
         if self.validator.filename() is not None:
-            with open(self.validator.filename(),"w") as f:
-                if not self.validator.json():
+            # the report of the full sweep follows the one of the quick rescan,
+            # the JSON one is a single document holding both
+            append = self.previous is not None and not self.validator.json()
+            with open(self.validator.filename(),"a" if append else "w") as f:
+                if append:
+                    f.write("\n")
+                elif not self.validator.json():
                     f.write(self.header())
                 f.write(content)
             sys.stdout.write(f"Done ! See results in file {self.validator.filename()}")
         else:
             sys.stdout.write(content)
         sys.stdout.write("\n")
-        sys.stdout.write(self.checkForErrors())
\ No newline at end of file
+        sys.stdout.write(self.checkForErrors())
+        self.previous = self.result
+
+    def sendSummary(self):
+        # the results have already been streamed, only the summary record is left
+        sink = self.validator.getScan().sink
+        sink.write(self.toNDJSONSummary())
+        sink.close()
+        if self.validator.filename() is not None:
+            sys.stdout.write(f"Done ! See results in file {self.validator.filename()}\n")
+            sys.stdout.write(self.checkForErrors())
\ No newline at end of file
@@ -0,0 +1,131 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+
+import struct
+
+class UdpProbes:
+    # protocol specific payloads, a service answers only to a request it understands.
+    # Payloads are built on first use and cached, per port when they don't
+    # depend on the target, per port and target otherwise
+    GENERIC = b""
+    cache = {}
+
+    @staticmethod
+    def tlv(tag,value):
+        return bytes([tag,len(value)]) + value
+
+    @staticmethod
+    def dnsName(name):
+        packet = b""
+        for label in name.split("."):
+            if len(label) > 0:
+                packet += bytes([len(label)]) + label.encode()
+        return packet + b"\x00"
+
+    @staticmethod
+    def dns(address):
+        # standard query of the NS records of the root zone
+        return struct.pack(">HHHHHH",0x524e,0x0100,1,0,0,0) + UdpProbes.dnsName(".") + struct.pack(">HH",2,1)
+
+    @staticmethod
+    def mdns(address):
+        # DNS-SD services enumeration
+        return struct.pack(">HHHHHH",0,0,1,0,0,0) + UdpProbes.dnsName("_services._dns-sd._udp.local") + struct.pack(">HH",12,1)
+
+    @staticmethod
+    def ntp(address):
+        # version 4 client request
+        return b"\xe3" + b"\x00" * 47
+
+    @staticmethod
+    def snmp(address):
+        # version 1 get-request of sysDescr.0 with the public community
+        tlv = UdpProbes.tlv
+        varbind = tlv(0x30,tlv(0x06,b"\x2b\x06\x01\x02\x01\x01\x01\x00") + tlv(0x05,b""))
+        pdu = tlv(0xa0,tlv(0x02,b"\x52") + tlv(0x02,b"\x00") + tlv(0x02,b"\x00") + tlv(0x30,varbind))
+        return tlv(0x30,tlv(0x02,b"\x00") + tlv(0x04,b"public") + pdu)
+
+    @staticmethod
+    def netbios(address):
+        # node status request of the wildcard name
+        name = b"CK" + b"A" * 30
+        return struct.pack(">HHHHHH",0x524e,0,1,0,0,0) + bytes([len(name)]) + name + b"\x00" + struct.pack(">HH",0x21,1)
+
+    @staticmethod
+    def rpcbind(address):
+        # NULL procedure of the portmapper
+        return struct.pack(">IIIIII",0x524e5053,0,2,100000,2,0) + b"\x00" * 16
+
+    @staticmethod
+    def tftp(address):
+        # read request, any answer (even an error) means open
+        return b"\x00\x01rnps\x00octet\x00"
+
+    @staticmethod
+    def ssdp(address):
+        return (
+            b"M-SEARCH * HTTP/1.1\r\n"
+            b"HOST: 239.255.255.250:1900\r\n"
+            b"MAN: \"ssdp:discover\"\r\n"
+            b"MX: 1\r\n"
+            b"ST: ssdp:all\r\n\r\n"
+        )
+
+    @staticmethod
+    def memcached(address):
+        return b"\x00\x01\x00\x00\x00\x01\x00\x00version\r\n"
+
+    @staticmethod
+    def sip(address):
+        return (
+            f"OPTIONS sip:{address} SIP/2.0\r\n"
+            f"Via: SIP/2.0/UDP {address};branch=z9hG4bKrnps\r\n"
+            f"From: <sip:rnps@{address}>;tag=rnps\r\n"
+            f"To: <sip:{address}>\r\n"
+            f"Call-ID: rnps@{address}\r\n"
+            "CSeq: 1 OPTIONS\r\n"
+            "Max-Forwards: 70\r\n"
+            "Content-Length: 0\r\n\r\n"
+        ).encode()
+
+    # port : (builder, depends on the target)
+    PORTS = {
+        53:(dns,False),
+        69:(tftp,False),
+        111:(rpcbind,False),
+        123:(ntp,False),
+        137:(netbios,False),
+        161:(snmp,False),
+        1900:(ssdp,False),
+        5060:(sip,True),
+        5353:(mdns,False),
+        11211:(memcached,False),
+    }
+
+    @staticmethod
+    def getPayload(address,port):
+        if port not in UdpProbes.PORTS:
+            return UdpProbes.GENERIC
+        builder,perTarget = UdpProbes.PORTS[port]
+        key = (port,address) if perTarget else port
+        payload = UdpProbes.cache.get(key)
+        if payload is None:
+            payload = builder.__func__(address)
+            UdpProbes.cache[key] = payload
+        return payload
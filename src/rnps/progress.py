@@ -0,0 +1,181 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+from collections import deque
+import math
+import sys
+from threading import Event
+from time import monotonic
+
+class Progress:
+    # counters of a running scan. The processes of a --processes scan add
+    # to a shared array, read by the scan that started them.
+    # A hook is called as hook(snapshot) at most every INTERVAL seconds
+    INTERVAL = 0.2
+    WINDOW = 5
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.done = 0
+        self.open = 0
+        self.shared = None
+        self.hooks = []
+        self.started = None
+        self.notified = 0
+        self.samples = deque()
+        self.finished = Event()
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self,state):
+        self.__init__()
+
+    def share(self,shared):
+        self.shared = shared
+
+    def start(self,total,done=0):
+        self.total = total
+        self.done = done
+        self.started = monotonic()
+        self.samples.clear()
+        self.samples.append((self.started,done))
+
+    def add(self,r):
+        if self.shared is not None:
+            with self.shared.get_lock():
+                self.shared[0] += 1
+                if r == 0:
+                    self.shared[1] += 1
+        else:
+            self.done += 1
+            if r == 0:
+                self.open += 1
+        if self.hooks and monotonic() - self.notified >= self.INTERVAL:
+            self.notify()
+
+    def addHook(self,hook):
+        self.hooks.append(hook)
+
+    def notify(self):
+        self.notified = monotonic()
+        snapshot = self.snapshot()
+        for hook in self.hooks:
+            hook(snapshot)
+
+    def getDone(self):
+        return self.done + (self.shared[0] if self.shared is not None else 0)
+
+    def getOpen(self):
+        return self.open + (self.shared[1] if self.shared is not None else 0)
+
+    def getRate(self,now,done):
+        # probes per second over the last WINDOW seconds
+        if len(self.samples) == 0 or now - self.samples[-1][0] >= self.INTERVAL:
+            self.samples.append((now,done))
+        while len(self.samples) > 1 and now - self.samples[0][0] > self.WINDOW:
+            self.samples.popleft()
+        first,count = self.samples[0]
+        if now - first <= 0:
+            return 0
+        return (done - count) / (now - first)
+
+    def snapshot(self):
+        now = monotonic()
+        done = self.getDone()
+        rate = self.getRate(now,done) if self.started is not None else 0
+        remaining = max(0,self.total - done)
+        return {
+            "done":done,
+            "total":self.total,
+            "open":self.getOpen(),
+            "rate":rate,
+            "eta":remaining / rate if rate > 0 else None,
+            "elapsed":now - self.started if self.started is not None else 0,
+            "finished":self.finished.is_set(),
+        }
+
+    def finish(self):
+        self.finished.set()
+        if self.hooks:
+            self.notify()
+
+    def wait(self,timeout=None):
+        # True once the scan is over
+        return self.finished.wait(timeout)
+
+class Renderer:
+    # draws the progress on a single line of a terminal, nothing when the output is piped
+    INTERVAL = Progress.INTERVAL
+    BAR = [
+        " [■     ]",
+        " [■■    ]",
+        " [■■■   ]",
+        " [■■■■  ]",
+        " [■■■■■ ]",
+        " [■■■■■■]",
+        " [ ■■■■■]",
+        " [  ■■■■]",
+        " [   ■■■]",
+        " [    ■■]",
+        " [     ■]",
+        " [      ]",
+    ]
+
+    def __init__(self,progress,stream=None) -> None:
+        self.progress = progress
+        self.stream = stream if stream is not None else sys.stdout
+        self.enabled = self.stream.isatty()
+        self.counter = 0
+        self.width = 0
+
+    @staticmethod
+    def formatTime(seconds):
+        minutes,seconds = divmod(math.ceil(seconds),60)
+        hours,minutes = divmod(minutes,60)
+        return f"{hours}:{minutes:02}:{seconds:02}"
+
+    def line(self,snapshot):
+        bar = self.BAR[self.counter % len(self.BAR)]
+        if snapshot["total"] == 0:
+            return bar
+        percent = 100 * snapshot["done"] / snapshot["total"]
+        eta = self.formatTime(snapshot["eta"]) if snapshot["eta"] is not None else "-:--:--"
+        return (f"{bar} {snapshot['done']}/{snapshot['total']} ({percent:.1f}%), "
+                f"open {snapshot['open']}, {snapshot['rate']:.0f} probes/s, ETA {eta}")
+
+    def draw(self):
+        if not self.enabled:
+            return
+        line = self.line(self.progress.snapshot())
+        self.stream.write(line.ljust(self.width) + "\r")
+        self.stream.flush()
+        self.width = len(line)
+        self.counter += 1
+
+    def clear(self):
+        if self.enabled and self.width > 0:
+            self.stream.write(" " * self.width + "\r")
+            self.stream.flush()
+            self.width = 0
+
+    def run(self):
+        # until the scan is over, wakes up as soon as it is
+        while not self.progress.wait(self.INTERVAL):
+            self.draw()
+        self.clear()
@@ -0,0 +1,81 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+from ipaddress import ip_address
+import socket
+from threading import Lock
+from time import monotonic
+
+class ResolverException(Exception):
+
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+class Resolver:
+    # resolves hostnames to all their A and AAAA records, many at once on a bounded
+    # pool of threads. The answers are cached for TTL seconds (getaddrinfo does not
+    # report the TTL of the records), a daemon resolves the same names only once
+    WORKERS = 32
+    TTL = 300
+    default = None
+
+    def __init__(self,workers=WORKERS,ttl=TTL) -> None:
+        self.workers = workers
+        self.ttl = ttl
+        self.cache = {}
+        self.lock = Lock()
+
+    @staticmethod
+    def getDefault():
+        if Resolver.default is None:
+            Resolver.default = Resolver()
+        return Resolver.default
+
+    def lookup(self,name):
+        now = monotonic()
+        with self.lock:
+            entry = self.cache.get(name)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        try:
+            infos = socket.getaddrinfo(name,None,type=socket.SOCK_STREAM)
+        except OSError as e:
+            raise ResolverException("Unable to resolve {} : {}".format(name,e))
+        # the scope of link-local IPv6 addresses is dropped
+        addresses = list(dict.fromkeys(ip_address(info[4][0].split("%",1)[0]) for info in infos))
+        with self.lock:
+            self.cache[name] = (now + self.ttl,addresses)
+        return addresses
+
+    def resolve(self,names):
+        # returns {name:addresses} and {name:error}
+        names = list(dict.fromkeys(names))
+        resolved = {}
+        errors = {}
+        if len(names) == 0:
+            return resolved,errors
+        # only the hostnames need the pool, the addresses never get here
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.workers,len(names))) as executor:
+            futures = {executor.submit(self.lookup,name):name for name in names}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    resolved[futures[future]] = future.result()
+                except ResolverException as e:
+                    errors[futures[future]] = e
+        return resolved,errors
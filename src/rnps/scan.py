@@ -16,23 +16,73 @@
 # along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
 # ----------------------------------------------------------------------------------------
 
+import errno
+from array import array
 from ipaddress import IPv4Address
-from pickle import LIST
-from random import randint
+import os
+import signal
 import socket
-import struct
-from threading import Thread
-from time import time
-from typing import Any, Callable, Iterable, Mapping
+from threading import Event, Thread
+from time import monotonic, time
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Mapping
+from rnps.engine import Engine
 from rnps.host import Host
+from rnps.limits import Budget, Concurrency
+from rnps.metrics import Metrics
 from rnps.port import Port, PortService
-import concurrent.futures
+from rnps.probes import UdpProbes
+from rnps.progress import Progress
+from rnps.stream import NdjsonSink
+from rnps.targets import Targets
+from rnps.timing import Timing, TokenBucket
+if TYPE_CHECKING:
+    import asyncio
+    import concurrent.futures
+    from rnps.banner import Banners
+    from rnps.baseline import Baseline
+    from rnps.checkpoint import Checkpoint
 ######################################################################################################
 class ScanException(Exception):
 
     def __init__(self, *args: object) -> None:
         super().__init__(*args)
 
+######################################################################################################
+class HostResult:
+    # the results of a host are kept as two parallel arrays of ports and result codes,
+    # the dict of each port (and its service name) is only built when it is read
+
+    def __init__(self,port_type=Port.TCP) -> None:
+        self.port_type = port_type
+        self.ports = array('H')
+        self.codes = array('i')
+
+    def add(self,port,port_type,result):
+        self.port_type = port_type
+        self.ports.append(port)
+        self.codes.append(result)
+
+    def extend(self,other):
+        self.port_type = other.port_type
+        self.ports.extend(other.ports)
+        self.codes.extend(other.codes)
+
+    def item(self,port,result):
+        return {"port":port,"port_type":self.port_type,"service":PortService.getServiceName(port,self.port_type),"result":result}
+
+    def toList(self):
+        return list(self)
+
+    def __len__(self):
+        return len(self.ports)
+
+    def __getitem__(self,index):
+        return self.item(self.ports[index],self.codes[index])
+
+    def __iter__(self):
+        for port,result in zip(self.ports,self.codes):
+            yield self.item(port,result)
+
 ######################################################################################################
 class ScanResult:
 
@@ -62,9 +112,9 @@ class ScanResult:
 
     def addHostResult(self,host,result=None):
         if host not in self.__result["hosts"]:
-            self.__result["hosts"][host] = []
+            self.__result["hosts"][host] = HostResult()
         if result is not None:
-            self.__result["hosts"][host].append(result)
+            self.__result["hosts"][host].add(result["port"],result["port_type"],result["result"])
 
     def getStartTimestamp(self) -> float:
         return self.__result["timestamps"]["start"]
@@ -78,6 +128,34 @@ class ScanResult:
     def getHosts(self):
         return self.__result["hosts"]
 
+    def addStreamed(self,result):
+        # only the counters are kept when the results are streamed
+        if "streamed" not in self.__result:
+            self.__result["streamed"] = {"probes":0,"open":0}
+        self.__result["streamed"]["probes"] += 1
+        if result == 0:
+            self.__result["streamed"]["open"] += 1
+
+    def addBanner(self,host,port,banner):
+        if "banners" not in self.__result:
+            self.__result["banners"] = {}
+        self.__result["banners"].setdefault(host,{})[port] = banner
+
+    def getBanner(self,host,port):
+        return self.__result.get("banners",{}).get(host,{}).get(port)
+
+    def setDiff(self,opened,closed):
+        self.__result["diff"] = {
+            "opened":[{"host":host,"port":port} for host,port in opened],
+            "closed":[{"host":host,"port":port} for host,port in closed]
+        }
+
+    def setDiscovery(self,total,alive):
+        self.__result["discovery"] = {
+            "total":total,
+            "alive":alive
+        }
+
     def getResults(self):
             return self.__result
     
@@ -99,6 +177,20 @@ class ScanResult:
             "description": str(e)
         })
 
+    def merge(self,result):
+        for host in result["hosts"]:
+            if host not in self.__result["hosts"]:
+                self.__result["hosts"][host] = HostResult()
+            self.__result["hosts"][host].extend(result["hosts"][host])
+        for kind in self.__result["errors"]:
+            self.__result["errors"][kind].extend(result["errors"][kind])
+        for host,banners in result.get("banners",{}).items():
+            for port,banner in banners.items():
+                self.addBanner(host,int(port),banner)
+        if "streamed" in result:
+            for key,value in result["streamed"].items():
+                self.__result.setdefault("streamed",{"probes":0,"open":0})[key] += value
+
     def getMainErrors(self):
         return self.__result["errors"]["main"]
 
@@ -110,6 +202,7 @@ class ScanResult:
 
 ######################################################################################################
 class Scan(Thread):
+    TIMEOUT = Timing.INITIAL_TIMEOUT
 
     def __init__(   self, 
                     group: None = None, 
@@ -123,6 +216,26 @@ class Scan(Thread):
                     port: Port = None,
                     verbose: bool = False,
                     maxThreads: int = None,
+                    engine: str = None,
+                    concurrency: int = None,
+                    processes: int = None,
+                    minTimeout: float = None,
+                    maxTimeout: float = None,
+                    rate: float = None,
+                    burst: int = None,
+                    discovery: bool = True,
+                    addresses: list = None,
+                    sink: NdjsonSink = None,
+                    checkpoint: "Checkpoint" = None,
+                    baseline: "Baseline" = None,
+                    shard: tuple = None,
+                    seed: int = None,
+                    metrics: Metrics = None,
+                    executor: "concurrent.futures.Executor" = None,
+                    loop: "asyncio.AbstractEventLoop" = None,
+                    bucket: TokenBucket = None,
+                    budget: Budget = None,
+                    banners: "Banners" = None,
                     ) -> None:
         super().__init__(group, target, name, args, kwargs, daemon=daemon)
         if host is None :
@@ -133,78 +246,260 @@ class Scan(Thread):
         self.port = port
         self.verbose = verbose
         self.maxThreads = maxThreads
+        self.concurrency = concurrency
+        self.processes = processes
+        self.discovery = discovery
+        self.sink = sink
+        self.checkpoint = checkpoint
+        self.baseline = baseline
+        self.shard = shard
+        self.seed = seed
+        self.metrics = metrics
+        # the open ports are handed to the banner stage, see Banners
+        self.banners = banners
+        if banners is not None:
+            banners.attach(self)
+        # a worker pool and an event loop kept between scans, see Scanner
+        self.executor = executor
+        self.loop = loop
+        self.progress = Progress()
+        self.stopping = Event()
+        self.space = Targets(host,port,shard,addresses,seed)
+        self.timing = Timing(self.TIMEOUT,minTimeout,maxTimeout)
+        # a bucket given is shared with other scans, a budget for all of them.
+        # The rate of the scan is kept within it, each probe takes a token of both
+        self.bucket = TokenBucket(rate,burst,bucket) if rate is not None else bucket
+        # the probes in flight of the scans sharing the budget, see Scanner
+        self.budget = budget
+        self.engine = Engine.create(engine if engine is not None else Engine.getDefault(port.type),self)
+        self.options = {
+            "host":host,
+            "port":port,
+            "verbose":verbose,
+            "maxThreads":maxThreads,
+            "engine":self.engine.NAME,
+            "concurrency":concurrency,
+            "minTimeout":minTimeout,
+            "maxTimeout":maxTimeout,
+            "rate":rate,
+            "burst":burst,
+            "discovery":discovery,
+            "addresses":addresses,
+            "sink":sink,
+            "baseline":baseline,
+            "seed":seed,
+            "metrics":metrics,
+            "banners":banners,
+        }
         self.results = ScanResult()
 
+    def getTotalTargets(self):
+        return self.space.count()
+
+    def getDoneTargets(self):
+        # the targets completed before a checkpoint
+        if self.checkpoint is None:
+            return 0
+        return self.checkpoint.watermark + len(self.checkpoint.completed)
+
     def getMaxWorkers(self):
-        max_workers = sum(1 for n in self.host.address.network.hosts()) * len(self.port.range)
+        max_workers = self.getTotalTargets()
         if self.maxThreads is not None:
             max_workers = min(self.maxThreads,max_workers)
         return max_workers
 
+    def targets(self):
+        return iter(self.space)
+
     def run(self):
         try:
             self.results.setStartTimestamp(time())
-            futures = []
-            with concurrent.futures.ThreadPoolExecutor(max_workers=self.getMaxWorkers()) as executor:
-                for address in self.host.address.network.hosts():
-                        for port in self.port.range:
-                            futures.append(executor.submit(self.task,address,port,self.port.type))
-                for d in concurrent.futures.as_completed(futures):
-                    try:
-                        item = d.result()
-                        host = item.pop("host")
-                        if item["result"] != 0 and not self.verbose:
-                            self.results.addHostResult(host,None)
-                        else:
-                            self.results.addHostResult(host,item)
-                    except Exception as e:
-                        self.results.addTaskError(e)
-        except concurrent.futures.TimeoutError as e:
+            resuming = self.checkpoint is not None and self.checkpoint.isResuming()
+            if self.sink is not None and self.shard is None and not resuming:
+                self.sink.open()
+            if resuming:
+                self.resume()
+            elif self.baseline is not None:
+                self.space = self.baseline.getTargets(self.space,self.port.type,self.shard)
+            elif self.discovery and self.space.hosts > 1:
+                self.discover()
+            if self.checkpoint is not None:
+                if self.getProcesses() > 1:
+                    raise ScanException("A checkpoint can't be used with more than one process")
+                self.space.skip(self.checkpoint)
+            self.progress.start(self.getTotalTargets(),self.getDoneTargets())
+            if self.getProcesses() > 1:
+                self.runShards()
+            else:
+                self.engine.run()
+            if self.baseline is not None:
+                self.results.setDiff(*self.baseline.diff(self.results,self.port.type))
+        except TimeoutError as e:
+            # concurrent.futures.TimeoutError, the builtin one since Python 3.11
             self.results.addTimeoutError(e)
         except Exception as e:
             self.results.addMainError(e)
         finally:
+            if self.banners is not None:
+                self.banners.join()
             self.results.setEndTimestamp(time())
             self.results.setElapsedTimestamp(self.results.getEndTimestamp() - self.results.getStartTimestamp())
+            if self.checkpoint is not None and self.checkpoint.targets is not None:
+                self.checkpoint.save(self.result())
+            self.progress.finish()
+
+    def stop(self):
+        # no more probes are started, the ones in flight complete
+        self.stopping.set()
+
+    def resume(self):
+        self.results.merge(self.checkpoint.result)
+        if "discovery" in self.checkpoint.result:
+            self.results.setDiscovery(**self.checkpoint.result["discovery"])
+        if self.checkpoint.addresses is not None:
+            self.space = Targets(self.host,self.port,self.shard,self.checkpoint.addresses,self.seed)
+
+    def discover(self):
+        # the port scan runs only against the addresses that answered,
+        # and starts with the round-trip times measured by the discovery
+        from rnps.discovery import Discovery
+        discovery = Discovery(self)
+        discovery.run()
+        addresses = discovery.getAliveAddresses()
+        self.results.setDiscovery(self.space.hosts,len(addresses))
+        self.space = Targets(self.host,self.port,self.shard,addresses,self.seed)
+        self.timing = discovery.timing
+        self.options["discovery"] = False
+        self.options["addresses"] = addresses
+
+    def getProcesses(self):
+        processes = self.processes if self.processes is not None else 1
+        if processes == 0:
+            processes = os.cpu_count() or 1
+        return max(1,min(processes,self.getTotalTargets()))
+
+    def runShards(self):
+        # every process scans one target every N with its own engine,
+        # the partial results are merged back into this scan
+        # imported here, a scan in a single process doesn't pay for them
+        import concurrent.futures
+        import multiprocessing
+        processes = self.getProcesses()
+        options = dict(self.options)
+        if options["rate"] is not None:
+            # the rate is shared by all the processes
+            options["rate"] = options["rate"] / processes
+            if options["burst"] is not None:
+                options["burst"] = max(1,options["burst"] // processes)
+        # the processes count their probes in a shared array, for the progress
+        shared = multiprocessing.Array('q',2)
+        self.progress.share(shared)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes,initializer=initShard,initargs=(shared,)) as executor:
+            futures = [executor.submit(scanShard,options,(index,processes)) for index in range(processes)]
+            for d in concurrent.futures.as_completed(futures):
+                result,metrics = d.result()
+                self.results.merge(result)
+                if self.metrics is not None:
+                    self.metrics.merge(metrics)
+
+    def getTimeout(self,address):
+        return self.timing.timeout(address)
+
+    def observe(self,address,port_type,r,elapsed):
+        # a refused connection is an answer too, timeouts are never sampled
+        if r == 0 or r == errno.ECONNREFUSED:
+            self.timing.sample(address,elapsed)
+        if self.metrics is not None:
+            self.metrics.observe(r,elapsed)
+
+    def collect(self,item):
+        self.progress.add(item["result"])
+        if self.metrics is not None:
+            self.metrics.result(item["result"])
+        if self.checkpoint is not None:
+            self.checkpoint.done(item["host"],item["port"])
+            if self.checkpoint.isDue():
+                self.checkpoint.save(self.result())
+        if self.sink is not None:
+            self.stream(item)
+            return
+        host = item.pop("host")
+        if item["result"] != 0 and not self.verbose:
+            self.results.addHostResult(host,None)
+        else:
+            self.results.addHostResult(host,item)
+
+    def stream(self,item):
+        # the open ports are still kept when compared with a baseline, see Baseline.diff
+        self.results.addHostResult(item["host"],item if item["result"] == 0 and self.baseline is not None else None)
+        self.results.addStreamed(item["result"])
+        if item["result"] == 0 or self.verbose:
+            self.sink.write(dict(type="port",timestamp=time(),service=PortService.getServiceName(item["port"],item["port_type"]),**item))
+
+    def handoff(self,address,port,sock):
+        # an open TCP port goes to the banner stage with its connection,
+        # the engine closes its own socket as usual
+        if self.banners is not None:
+            self.banners.submit(address,port,sock)
+
+    def addBanner(self,host,port,banner):
+        self.results.addBanner(host,port,banner)
+        if self.sink is not None:
+            self.sink.write(dict(type="banner",timestamp=time(),host=host,port=port,**banner))
+
+    def makeResult(self,address,port,port_type,r):
+        return {"host":str(address),"port":port,"port_type":port_type,"result":r}
         
-    def task(self,address,port,port_type):
+    def task(self,address,port,port_type,queued=None):
         socket_type = socket.SOCK_STREAM if port_type == Port.TCP else socket.SOCK_DGRAM
         socket_family = socket.AF_INET if type(address) is IPv4Address else socket.AF_INET6
         with socket.socket(socket_family, socket_type) as sock:
-            sock.settimeout(1)
+            sock.settimeout(self.getTimeout(address))
             r = -1
+            start = monotonic()
+            if queued is not None:
+                self.metrics.queued(start - queued)
             try:
                 if port_type == Port.TCP:
                     r = sock.connect_ex((str(address),port))
+                    if r == 0:
+                        self.handoff(address,port,sock)
                 else:
-                    sock.sendto(bytes(self.getDataPacket(str(address),port)),(str(address),port))
-                    sock.recvfrom(1024)
+                    # a connected socket receives the ICMP port unreachable as ECONNREFUSED
+                    sock.connect((str(address),port))
+                    sock.send(self.getDataPacket(str(address),port))
+                    sock.recv(1024)
                     r = 0
             except socket.error as e:
-                 r = -1
-            finally:
-                sock.close()
-                service = PortService.getServiceName(port)
-                return {"host":str(address),"port":port,"port_type":port_type,"service":service,"result":r}
+                # resource errors are raised, the engine retries the probe later
+                if Concurrency.isResourceError(e):
+                    raise
+                r = errno.ECONNREFUSED if e.errno == errno.ECONNREFUSED else -1
+            if Concurrency.isResourceError(r):
+                raise OSError(r,os.strerror(r))
+            self.observe(address,port_type,r,monotonic() - start)
+            return self.makeResult(address,port,port_type,r)
 
     def getDataPacket(self,host,port):
-        packet = struct.pack(">H",port)
-        packet += struct.pack(">H", 0x0100)
-        packet += struct.pack(">H", 1)
-        packet += struct.pack(">H", 0)
-        packet += struct.pack(">H", 0)
-        packet += struct.pack(">H", 0)
-        for h in host.split("."):
-            packet += struct.pack("B", len(h))
-            for s in h:
-                packet += struct.pack('c',s.encode())
-        packet += struct.pack("B", 0)
-        packet += struct.pack(">H", 1)
-        packet += struct.pack(">H", 1)
-        return packet
+        return UdpProbes.getPayload(host,port)
 
     def result(self):
         return self.results.getResults()
 
     def getStartTimestamp(self):
-        return self.results.getStartTimestamp()
\ No newline at end of file
+        return self.results.getStartTimestamp()
+
+######################################################################################################
+shared = None
+
+def initShard(progress):
+    global shared
+    # the parent process handles the interruption
+    signal.signal(signal.SIGINT,signal.SIG_DFL)
+    shared = progress
+
+def scanShard(options,shard):
+    scan = Scan(shard=shard,**options)
+    scan.progress.share(shared)
+    scan.run()
+    return scan.result(),scan.metrics.toDict() if scan.metrics is not None else None
\ No newline at end of file
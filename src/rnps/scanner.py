@@ -0,0 +1,189 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+import asyncio
+import concurrent.futures
+import queue
+from threading import Lock, Thread
+from rnps.engine import AsyncEngine, Engine
+from rnps.host import Host, Hosts
+from rnps.limits import Budget, Limits
+from rnps.port import Port
+from rnps.scan import Scan
+from rnps.stream import CallbackSink
+from rnps.timing import TokenBucket
+
+class ScannerException(Exception):
+
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+class Scanner:
+    # rnps as a library. The worker threads of the thread engine and the event loop
+    # of the async engine are started once and kept between the scans,
+    # so a small scan costs little more than its probes. Examples :
+    #     with Scanner() as scanner:
+    #         for record in scanner.scan("192.168.1.10",[22,80,443]):
+    #             print(record["port"],record["service"])
+    #
+    #         async for record in scanner.scanAsync("192.168.1.10",range(1,1024)):
+    #             ...
+    # The records are the ones of --ndjson, only the open ports unless verbose
+    MAX_THREADS = 256
+    END = None
+
+    def __init__(self,engine=None,maxThreads=None,concurrency=None,minTimeout=None,maxTimeout=None,
+                 rate=None,burst=None,verbose=False,discovery=False,inflight=None) -> None:
+        self.engine = engine
+        self.maxThreads = maxThreads
+        self.concurrency = concurrency
+        self.minTimeout = minTimeout
+        self.maxTimeout = maxTimeout
+        self.rate = rate
+        self.burst = burst
+        self.verbose = verbose
+        self.discovery = discovery
+        # every scan takes from the same bucket, a scan with its own rate from both
+        self.bucket = TokenBucket(rate,burst) if rate is not None else None
+        # at most inflight probes for all the scans together, within the open files limit
+        self.budget = None
+        if inflight is not None:
+            Limits.raiseOpenFiles(inflight)
+            files = Limits.openFiles()
+            self.budget = Budget(inflight if files is None else min(inflight,files))
+        self.executor = None
+        self.loop = None
+        self.thread = None
+        self.lock = Lock()
+
+    def getExecutor(self):
+        with self.lock:
+            if self.executor is None:
+                workers = self.maxThreads if self.maxThreads is not None else self.MAX_THREADS
+                threads = Limits.threads()
+                if threads is not None:
+                    workers = min(workers,threads)
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers,thread_name_prefix="RNPS-Scanner")
+            return self.executor
+
+    def getLoop(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = Thread(target=self.loop.run_forever,name="RNPS-Scanner-Loop",daemon=True)
+                self.thread.start()
+            return self.loop
+
+    def create(self,host,ports,port_type=Port.TCP,callback=None,**options):
+        # options override the ones of the scanner for this scan only
+        engine = options.pop("engine",self.engine)
+        if engine is None:
+            engine = Engine.getDefault(port_type)
+        # a list of targets is resolved at once, see Hosts
+        addresses = None
+        if isinstance(host,(list,tuple)):
+            hosts = Hosts(host)
+            host,addresses = hosts.host,hosts.addresses
+        kwargs = dict(
+            host=host if isinstance(host,Host) else Host(host),
+            addresses=addresses,
+            port=Port(list(ports),port_type),
+            engine=engine,
+            maxThreads=self.maxThreads,
+            concurrency=self.concurrency,
+            minTimeout=self.minTimeout,
+            maxTimeout=self.maxTimeout,
+            bucket=self.bucket,
+            budget=self.budget,
+            verbose=self.verbose,
+            discovery=self.discovery,
+        )
+        kwargs.update(options)
+        kwargs["sink"] = CallbackSink(callback) if callback is not None else None
+        if engine == Engine.getDefault(Port.TCP) and port_type == Port.TCP:
+            kwargs["executor"] = self.getExecutor()
+        elif engine == AsyncEngine.NAME:
+            kwargs["loop"] = self.getLoop()
+        return Scan(name="RNPS-Scanner-Scan",**kwargs)
+
+    @staticmethod
+    def check(scan):
+        errors = scan.results.getMainErrors()
+        if len(errors) > 0:
+            raise ScannerException(errors[0]["description"])
+
+    def run(self,host,ports,port_type=Port.TCP,**options):
+        # scans and returns the whole result, as the --json output
+        scan = self.create(host,ports,port_type,**options)
+        scan.run()
+        self.check(scan)
+        return scan.result()
+
+    def scan(self,host,ports,port_type=Port.TCP,**options):
+        # yields the records as the probes complete
+        records = queue.SimpleQueue()
+        scan = self.create(host,ports,port_type,records.put,**options)
+        scan.progress.addHook(lambda snapshot: records.put(self.END) if snapshot["finished"] else None)
+        scan.start()
+        try:
+            while True:
+                record = records.get()
+                if record is self.END:
+                    break
+                yield record
+        finally:
+            # a loop left early stops the scan, the probes in flight complete
+            scan.stop()
+        scan.join()
+        self.check(scan)
+
+    async def scanAsync(self,host,ports,port_type=Port.TCP,**options):
+        # the same records, for the programs running an event loop
+        loop = asyncio.get_running_loop()
+        records = asyncio.Queue()
+        put = lambda record: loop.call_soon_threadsafe(records.put_nowait,record)
+        scan = self.create(host,ports,port_type,put,**options)
+        scan.progress.addHook(lambda snapshot: put(self.END) if snapshot["finished"] else None)
+        scan.start()
+        try:
+            while True:
+                record = await records.get()
+                if record is self.END:
+                    break
+                yield record
+        finally:
+            scan.stop()
+        await loop.run_in_executor(None,scan.join)
+        self.check(scan)
+
+    def close(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join()
+                self.loop.close()
+                self.loop = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
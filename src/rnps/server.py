@@ -0,0 +1,421 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+import argparse
+from collections import OrderedDict
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import itertools
+import json
+import os
+import queue
+import socketserver
+import stat
+import sys
+import textwrap
+from threading import Condition, Lock, Thread
+from time import time
+from rnps.args import Args
+from rnps.engine import Engine
+from rnps.scanner import Scanner
+from rnps.version import Version
+
+class JobException(Exception):
+
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+class Job:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    STOPPED = "stopped"
+    FAILED = "failed"
+    # parameters of the command line that make no sense for a job
+    UNSUPPORTED = ["processes","checkpoint","resume","baseline","full_sweep","file","json","ndjson","metrics_file"]
+    # options naming files of the daemon host, refused before the arguments are parsed
+    # the targets of a job are the ones of its arguments, -iL is refused as well
+    FILES = ["--resume","--checkpoint","--baseline","--services","-iL","--input-list"]
+
+    def __init__(self,argv) -> None:
+        self.id = None
+        self.argv = list(argv)
+        self.args = self.parse(self.argv)
+        self.state = self.QUEUED
+        self.scan = None
+        self.records = []
+        self.error = None
+        self.ended = False
+        self.created = time()
+        self.condition = Condition()
+
+    @staticmethod
+    def refuse(argv):
+        # argparse also takes --name=value and the unambiguous prefixes of the options (-i for -iL)
+        for arg in argv:
+            if arg == "--":
+                break
+            name = arg.split("=",1)[0]
+            for option in Job.FILES:
+                if name == option or (len(name) > (3 if name.startswith("--") else 1) and option.startswith(name)):
+                    raise JobException("{} can't be used in a job".format(option))
+
+    @staticmethod
+    def parse(argv):
+        Job.refuse(argv)
+        errors = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(errors):
+                args = Args(argv)
+        except SystemExit:
+            message = errors.getvalue().strip().splitlines()
+            raise JobException(message[-1] if message else "Invalid arguments : {}".format(" ".join(argv)))
+        for name in Job.UNSUPPORTED:
+            if getattr(args.args,name):
+                raise JobException("--{} can't be used in a job".format(name.replace("_","-")))
+        return args
+
+    def run(self,scanner):
+        with self.condition:
+            if self.state != self.QUEUED:
+                return
+            self.state = self.RUNNING
+        try:
+            args = self.args
+            self.scan = scanner.create(args.getHosts(),args.getPorts(),args.getPortType(),self.add,
+                                       verbose=args.isVerbose(),discovery=args.isDiscovery(),seed=args.getSeed(),
+                                       **{name:value for name,value in (
+                                           ("engine",args.getEngine()),
+                                           ("concurrency",args.getConcurrency()),
+                                           ("minTimeout",args.getMinTimeout()),
+                                           ("maxTimeout",args.getMaxTimeout()),
+                                           ("rate",args.getRate()),
+                                           ("burst",args.getBurst()),
+                                           ("banners",args.getBanners()),
+                                       ) if value is not None})
+            if self.state == self.STOPPED:
+                return
+            self.scan.run()
+            errors = self.scan.results.getMainErrors()
+            if len(errors) > 0:
+                self.error = errors[0]["description"]
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            with self.condition:
+                if self.error is not None:
+                    self.state = self.FAILED
+                elif self.state == self.RUNNING:
+                    self.state = self.DONE
+                self.ended = True
+                self.condition.notify_all()
+
+    def add(self,record):
+        with self.condition:
+            self.records.append(record)
+            self.condition.notify_all()
+
+    def stop(self):
+        with self.condition:
+            if self.state == self.QUEUED:
+                # never started, no worker will run it
+                self.ended = True
+            if self.state in (self.QUEUED,self.RUNNING):
+                self.state = self.STOPPED
+            self.condition.notify_all()
+        if self.scan is not None:
+            self.scan.stop()
+
+    def isOver(self):
+        return self.state in (self.DONE,self.STOPPED,self.FAILED)
+
+    def follow(self):
+        # yields the records of the job, waiting for the new ones until it has ended
+        index = 0
+        while True:
+            with self.condition:
+                while index == len(self.records) and not self.ended:
+                    self.condition.wait()
+                records = self.records[index:]
+                ended = self.ended
+            for record in records:
+                yield record
+            index += len(records)
+            if ended and len(records) == 0:
+                return
+
+    def status(self):
+        return {
+            "id":self.id,
+            "argv":self.argv,
+            "state":self.state,
+            "created":self.created,
+            "progress":self.scan.progress.snapshot() if self.scan is not None else None,
+            "error":self.error,
+        }
+
+    def summary(self):
+        result = self.scan.result() if self.scan is not None else None
+        return dict(type="summary",**self.status(),
+                    timestamps=result["timestamps"] if result is not None else None,
+                    errors=result["errors"] if result is not None else None)
+
+class Jobs:
+    # the queue of the jobs, run by a fixed number of workers on a shared scanner.
+    # The finished jobs are forgotten beyond KEEP
+    KEEP = 100
+
+    def __init__(self,scanner,workers) -> None:
+        self.scanner = scanner
+        self.jobs = OrderedDict()
+        self.queue = queue.Queue()
+        self.ids = itertools.count(1)
+        self.lock = Lock()
+        self.workers = [Thread(target=self.work,name=f"RNPS-Job-{n}",daemon=True) for n in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            job.run(self.scanner)
+
+    def submit(self,argv):
+        job = Job(argv)
+        with self.lock:
+            job.id = next(self.ids)
+            self.jobs[job.id] = job
+            self.forget()
+        self.queue.put(job)
+        return job
+
+    def forget(self):
+        over = [id for id,job in self.jobs.items() if job.isOver()]
+        for id in over[:max(0,len(over) - self.KEEP)]:
+            del self.jobs[id]
+
+    def get(self,id):
+        with self.lock:
+            return self.jobs.get(id)
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def close(self):
+        for job in self.list():
+            job.stop()
+        for worker in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+class Handler(BaseHTTPRequestHandler):
+    # POST   /jobs               {"argv":["192.168.1.0/24","--top","100"]}, queues a job
+    # GET    /jobs               the status of every job
+    # GET    /jobs/<id>          the status and the progress of a job
+    # GET    /jobs/<id>/results  the records of the job as NDJSON, streamed until it is over
+    # DELETE /jobs/<id>          stops a job
+    server_version = f"rnps/{Version.MAJOR}.{Version.MINOR}.{Version.PATCH}"
+
+    def log_message(self,format,*args):
+        if self.server.verbose:
+            sys.stderr.write("{} {}\n".format(self.log_date_time_string(),format % args))
+
+    def send(self,code,content):
+        body = (json.dumps(content) + "\n").encode()
+        self.send_response(code)
+        self.send_header("Content-Type","application/json")
+        self.send_header("Content-Length",str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def getJob(self,parts):
+        job = self.server.jobs.get(int(parts[1])) if len(parts) > 1 and parts[1].isdigit() else None
+        if job is None:
+            self.send(404,{"error":"Unknown job"})
+        return job
+
+    def route(self):
+        return [part for part in self.path.split("?",1)[0].split("/") if part]
+
+    def do_POST(self):
+        if self.route() != ["jobs"]:
+            return self.send(404,{"error":"Unknown path"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length",0))) or b"{}")
+            argv = body["argv"]
+            if not isinstance(argv,list) or not all(isinstance(a,str) for a in argv):
+                raise JobException("argv must be a list of strings")
+            job = self.server.jobs.submit(argv)
+        except (ValueError,KeyError,JobException) as e:
+            return self.send(400,{"error":str(e)})
+        self.send(201,job.status())
+
+    def do_GET(self):
+        parts = self.route()
+        if parts == ["jobs"]:
+            return self.send(200,[job.status() for job in self.server.jobs.list()])
+        if len(parts) not in (2,3) or parts[0] != "jobs" or (len(parts) == 3 and parts[2] != "results"):
+            return self.send(404,{"error":"Unknown path"})
+        job = self.getJob(parts)
+        if job is None:
+            return
+        if len(parts) == 2:
+            return self.send(200,job.status())
+        self.send_response(200)
+        self.send_header("Content-Type","application/x-ndjson")
+        self.end_headers()
+        try:
+            for record in job.follow():
+                self.wfile.write((json.dumps(record) + "\n").encode())
+                self.wfile.flush()
+            self.wfile.write((json.dumps(job.summary()) + "\n").encode())
+        except (BrokenPipeError,ConnectionResetError):
+            pass
+
+    def do_DELETE(self):
+        parts = self.route()
+        if len(parts) != 2 or parts[0] != "jobs":
+            return self.send(404,{"error":"Unknown path"})
+        job = self.getJob(parts)
+        if job is not None:
+            job.stop()
+            self.send(200,job.status())
+
+class HttpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+class UnixServer(socketserver.ThreadingMixIn,socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # unix sockets have no client address, the handler expects a tuple
+        request,address = super().get_request()
+        return request,("unix",0)
+
+class ServerArgs:
+    def __init__(self,argv=None) -> None:
+        self.parser = argparse.ArgumentParser(
+            prog='rnps serve',
+            formatter_class=argparse.RawTextHelpFormatter,
+            description=textwrap.dedent(f'''\
+                RNPS aka Rapid Network Port Scan, scan daemon
+                Ver {Version.MAJOR}.{Version.MINOR}.{Version.PATCH}
+                Jobs are posted as the parameters of the command line,
+                see the Server section of the README
+            ''')
+        )
+        self.parser.add_argument('--listen',type=str,default=f"{Server.ADDRESS}:{Server.PORT}",metavar='ADDRESS:PORT',help=textwrap.dedent(f'''\
+            The address of the HTTP server. Default : {Server.ADDRESS}:{Server.PORT}
+            '''))
+        self.parser.add_argument('--socket',type=str,metavar='PATH',help=textwrap.dedent('''\
+            Listen on a Unix socket instead of a TCP port
+            '''))
+        self.parser.add_argument('--jobs',type=int,default=Server.JOBS,metavar='N',help=textwrap.dedent(f'''\
+            The number of jobs running at the same time, the others wait in the queue.
+            Default : {Server.JOBS}
+            '''))
+        self.parser.add_argument('--engine',type=str,choices=Engine.names(),help=textwrap.dedent('''\
+            The engine of the jobs that don't choose one
+            '''))
+        self.parser.add_argument('-t','--max-threads',type=int,help=textwrap.dedent(f'''\
+            The threads of the pool shared by all the jobs of the thread engine.
+            Default : {Scanner.MAX_THREADS}
+            '''))
+        self.parser.add_argument('-c','--concurrency',type=Args.positive_int,default=Engine.MAX_CONCURRENCY,metavar='N',help=textwrap.dedent(f'''\
+            At most N probes in flight for all the jobs together, within the open files limit.
+            The -c of a job limits that job only.
+            Default : {Engine.MAX_CONCURRENCY}
+            '''))
+        self.parser.add_argument('--rate',type=Args.positive_float,metavar='N',help=textwrap.dedent('''\
+            At most N probes per second for all the jobs together,
+            a job with its own --rate is paced by both
+            '''))
+        self.parser.add_argument('--burst',type=Args.positive_int,metavar='M',help=textwrap.dedent('''\
+            With --rate, the number of probes that can be sent at once
+            '''))
+        self.parser.add_argument('-v','--verbose',action='store_true',help=textwrap.dedent('''\
+            Log the requests
+            '''))
+        self.args = self.parser.parse_args(argv)
+
+    def getAddress(self):
+        host,_,port = self.args.listen.rpartition(":")
+        try:
+            return host or Server.ADDRESS,int(port)
+        except ValueError:
+            self.parser.error("Invalid address {}".format(self.args.listen))
+
+class Server:
+    ADDRESS = "127.0.0.1"
+    PORT = 8642
+    JOBS = 4
+
+    def __init__(self,args) -> None:
+        self.args = args
+        self.scanner = Scanner(engine=args.args.engine,maxThreads=args.args.max_threads,
+                               rate=args.args.rate,burst=args.args.burst,inflight=args.args.concurrency)
+        self.jobs = Jobs(self.scanner,max(1,args.args.jobs))
+        if args.args.socket is not None:
+            self.removeSocket(args.args.socket)
+            self.httpd = UnixServer(args.args.socket,Handler)
+            self.address = args.args.socket
+        else:
+            self.httpd = HttpServer(args.getAddress(),Handler)
+            self.address = "http://{}:{}".format(*self.httpd.server_address[:2])
+        self.httpd.jobs = self.jobs
+        self.httpd.verbose = args.args.verbose
+
+    def run(self):
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        # from another thread, serve_forever returns
+        self.httpd.shutdown()
+
+    def close(self):
+        self.httpd.server_close()
+        self.jobs.close()
+        self.scanner.close()
+        if self.args.args.socket is not None:
+            self.removeSocket(self.args.args.socket)
+
+    @staticmethod
+    def removeSocket(path):
+        # only the socket left by a server is removed, any other file makes the bind fail
+        try:
+            if stat.S_ISSOCK(os.lstat(path).st_mode):
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+def serve(argv):
+    server = Server(ServerArgs(argv))
+    sys.stdout.write(f"rnps serve listening on {server.address}\n")
+    sys.stdout.flush()
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
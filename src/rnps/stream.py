@@ -0,0 +1,77 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+
+import sys
+from threading import Lock
+
+class NdjsonSink:
+    # one JSON record per line, written as soon as it is produced.
+    # The sink can be sent to other processes, they append to the same file
+
+    def __init__(self,filename=None) -> None:
+        self.filename = filename
+        self.file = None
+        self.opened = False
+        self.lock = Lock()
+
+    def __getstate__(self):
+        return {"filename":self.filename}
+
+    def __setstate__(self,state):
+        self.__init__(state["filename"])
+
+    def open(self):
+        # the file is emptied once, the full sweep of a baseline follows the quick rescan
+        if self.filename is not None and not self.opened:
+            open(self.filename,"w").close()
+        self.opened = True
+
+    def getFile(self):
+        if self.file is None:
+            self.file = open(self.filename,"a") if self.filename is not None else sys.stdout
+        return self.file
+
+    def write(self,record):
+        import json
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            f = self.getFile()
+            f.write(line)
+            f.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None and self.file is not sys.stdout:
+                self.file.close()
+            self.file = None
+
+class CallbackSink:
+    # hands every record to a function, used by Scanner.
+    # It can't be sent to other processes
+    def __init__(self,callback) -> None:
+        self.callback = callback
+
+    def open(self):
+        pass
+
+    def write(self,record):
+        self.callback(record)
+
+    def close(self):
+        pass
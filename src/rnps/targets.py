@@ -0,0 +1,176 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+
+from ipaddress import ip_address
+
+class TargetsException(Exception):
+
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+class Permutation:
+    # a pseudo-random bijection of range(size), a small Feistel network
+    # over the next even power of two, walking the cycle until the value
+    # falls inside the range. Nothing is stored but the round keys
+    ROUNDS = 4
+
+    def __init__(self,size,seed) -> None:
+        self.size = size
+        bits = max(2,(size - 1).bit_length())
+        self.half = (bits + 1) // 2
+        self.mask = (1 << self.half) - 1
+        # only the scans in a random order need it
+        from random import Random
+        generator = Random(seed)
+        self.keys = [generator.getrandbits(32) for _ in range(self.ROUNDS)]
+
+    def round(self,value,key):
+        value = ((value ^ key) * 0x45d9f3b) & 0xffffffff
+        value = ((value >> 16) ^ value) * 0x45d9f3b & 0xffffffff
+        return ((value >> 16) ^ value) & self.mask
+
+    def encrypt(self,value):
+        left, right = value >> self.half, value & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self.round(right,key)
+        return (left << self.half) | right
+
+    def decrypt(self,value):
+        left, right = value >> self.half, value & self.mask
+        for key in reversed(self.keys):
+            left, right = right ^ self.round(left,key), left
+        return (left << self.half) | right
+
+    def forward(self,position):
+        index = self.encrypt(position)
+        while index >= self.size:
+            index = self.encrypt(index)
+        return index
+
+    def inverse(self,index):
+        position = self.decrypt(index)
+        while position >= self.size:
+            position = self.decrypt(position)
+        return position
+
+class Targets:
+    def __init__(self,host,port,shard=None,addresses=None,seed=None) -> None:
+        self.network = host.address.network
+        self.ports = port.range
+        self.first, self.hosts = self.hostsRange(self.network)
+        # an explicit list of addresses replaces the hosts of the network
+        self.addresses = addresses
+        if addresses is not None:
+            self.hosts = len(addresses)
+        self.checkpoint = None
+        self.indexes = None
+        # with a seed the targets are visited in a random order, spreading
+        # the probes over all the hosts. The checkpoint and the shards
+        # work on the positions in that order
+        self.permutation = Permutation(self.hosts * len(self.ports),seed) if seed is not None else None
+        # a shard (index,count) keeps one target every count, starting from index
+        self.start, self.step = shard if shard is not None else (0,1)
+
+    @staticmethod
+    def hostsRange(network):
+        # first address and number of addresses returned by network.hosts(),
+        # computed without walking the network
+        first = int(network.network_address)
+        total = network.num_addresses
+        if network.version == 4 and network.prefixlen < 31:
+            return first + 1,total - 2
+        if network.version == 6 and network.prefixlen < 127:
+            return first + 1,total - 1
+        return first,total
+
+    def count(self):
+        total = self.hosts * len(self.ports)
+        return max(0,(total - self.start + self.step - 1) // self.step)
+
+    def address(self,index):
+        if self.addresses is not None:
+            return self.addresses[index]
+        return ip_address(self.first + index)
+
+    def skip(self,checkpoint):
+        # the targets completed before the checkpoint are not generated again
+        self.checkpoint = checkpoint
+        checkpoint.attach(self)
+
+    def getIndexes(self):
+        if self.indexes is None:
+            self.indexes = {
+                "ports":{p:i for i,p in enumerate(self.ports)},
+                "addresses":{a:i for i,a in enumerate(self.addresses)} if self.addresses is not None else None,
+            }
+        return self.indexes
+
+    def contains(self,address,port):
+        indexes = self.getIndexes()
+        if port not in indexes["ports"]:
+            return False
+        if indexes["addresses"] is not None:
+            return address in indexes["addresses"]
+        return address.version == self.network.version and 0 <= int(address) - self.first < self.hosts
+
+    def indexOf(self,address,port):
+        self.getIndexes()
+        if self.indexes["addresses"] is not None:
+            host = self.indexes["addresses"][address]
+        else:
+            host = int(address) - self.first
+        index = host * len(self.ports) + self.indexes["ports"][port]
+        return self.permutation.inverse(index) if self.permutation is not None else index
+
+    def get(self,index):
+        return self.address(index // len(self.ports)),self.ports[index % len(self.ports)]
+
+    def __iter__(self):
+        ports = len(self.ports)
+        current = None
+        first = self.start
+        if self.checkpoint is not None and self.checkpoint.watermark > first:
+            first += (self.checkpoint.watermark - first + self.step - 1) // self.step * self.step
+        for index in range(first,self.hosts * ports,self.step):
+            if self.checkpoint is not None and self.checkpoint.isDone(index):
+                continue
+            if self.permutation is not None:
+                index = self.permutation.forward(index)
+            host,port = divmod(index,ports)
+            if host != current:
+                address = self.address(host)
+                current = host
+            yield address,self.ports[port]
+
+class TargetList:
+    # an explicit list of (address,port) targets
+    def __init__(self,targets,shard=None) -> None:
+        self.targets = targets
+        self.hosts = len({address for address,port in targets})
+        self.addresses = None
+        self.start, self.step = shard if shard is not None else (0,1)
+
+    def count(self):
+        return max(0,(len(self.targets) - self.start + self.step - 1) // self.step)
+
+    def skip(self,checkpoint):
+        raise TargetsException("A checkpoint can't be used with a list of targets")
+
+    def __iter__(self):
+        return iter(self.targets[self.start::self.step])
@@ -0,0 +1,145 @@
+# ----------------------------------------------------------------------------------------
+# RNPS aka Rapid Network Port Scan
+# Copyright (C) 2022 Ivan Maruca <ivan>DOT<maruca>AT<gmail>DOT<com>
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+# 
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
+# ----------------------------------------------------------------------------------------
+
+
+from threading import Lock
+from time import monotonic
+
+class RttEstimator:
+    # smoothed round-trip time and variance as in RFC 6298
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+
+    def __init__(self) -> None:
+        self.srtt = None
+        self.rttvar = None
+
+    def sample(self,rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+
+    def timeout(self):
+        if self.srtt is None:
+            return None
+        return self.srtt + self.K * self.rttvar
+
+class Timing:
+    INITIAL_TIMEOUT = 1
+    MIN_TIMEOUT = 0.05
+    MAX_TIMEOUT = 5
+
+    def __init__(self,initial=None,floor=None,ceiling=None) -> None:
+        self.floor = floor if floor is not None else self.MIN_TIMEOUT
+        self.ceiling = ceiling if ceiling is not None else max(self.MAX_TIMEOUT,self.floor)
+        self.initial = initial if initial is not None else self.INITIAL_TIMEOUT
+        self.hosts = {}
+        self.lock = Lock()
+
+    def clamp(self,timeout):
+        return min(max(timeout,self.floor),self.ceiling)
+
+    def timeout(self,address):
+        # until a host answers once, its probes use the initial timeout
+        estimator = self.hosts.get(address)
+        timeout = estimator.timeout() if estimator is not None else None
+        return self.clamp(timeout if timeout is not None else self.initial)
+
+    def sample(self,address,rtt):
+        with self.lock:
+            if address not in self.hosts:
+                self.hosts[address] = RttEstimator()
+            self.hosts[address].sample(rtt)
+
+class TokenBucket:
+    # the default burst is the number of tokens earned in BURST_TIME seconds
+    BURST_TIME = 0.01
+
+    def __init__(self,rate,burst=None,parent=None) -> None:
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1,int(rate * self.BURST_TIME))
+        self.tokens = self.capacity
+        self.last = monotonic()
+        self.lock = Lock()
+        # a budget shared with other buckets, each probe takes a token of both
+        self.parent = parent
+
+    def consume(self):
+        # takes a token and returns 0, or returns the seconds to wait for the next one
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.capacity,self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+            if self.parent is not None:
+                delay = self.parent.consume()
+                if delay > 0:
+                    return delay
+            self.tokens -= 1
+            return 0
+
+class HostPacing:
+    # the probes of each host spaced by an interval. Most systems send about one ICMP error
+    # per second to each host after a short burst, when the errors of a host that sent some
+    # stop coming back its probes are spaced by that second, then by twice the interval
+    # learned. It is lowered a little after every STREAK answers
+    MINIMUM = 0.01
+    MAXIMUM = 1
+    DECREASE = 0.9
+    STREAK = 20
+
+    def __init__(self) -> None:
+        # the interval, the time booked for the next probe, whether an ICMP error came back
+        # and the answers in a row
+        self.hosts = {}
+
+    def getHost(self,address):
+        host = self.hosts.get(address)
+        if host is None:
+            host = self.hosts[address] = [0,0,False,0]
+        return host
+
+    def reserve(self,address,now):
+        # returns the time the next probe of the host can be sent, and books it
+        host = self.getHost(address)
+        at = max(now,host[1])
+        host[1] = at + host[0]
+        return at
+
+    def answered(self,address,closed):
+        host = self.getHost(address)
+        host[2] = host[2] or closed
+        host[3] += 1
+        if host[3] >= self.STREAK:
+            host[3] = 0
+            host[0] = host[0] * self.DECREASE if host[0] * self.DECREASE >= self.MINIMUM else 0
+
+    def lost(self,address):
+        # nothing came back, a host that sent ICMP errors before is likely rate limiting them
+        host = self.getHost(address)
+        host[3] = 0
+        if host[2]:
+            interval = min(self.MAXIMUM,host[0] * 2) if host[0] > 0 else self.MAXIMUM
+            # the probe booked last is followed by the new interval
+            host[1] += interval - host[0]
+            host[0] = interval
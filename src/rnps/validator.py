@@ -16,26 +16,66 @@
 # along with this program.  If not, see https://www.gnu.org/licenses/agpl-3.0.en.html
 # ----------------------------------------------------------------------------------------
 
+import sys
 from rnps.args import Args
-from rnps.host import Host
-from rnps.port import Port
+from rnps.host import Hosts
+from rnps.metrics import Metrics
+from rnps.port import Port, PortService
 from rnps.scan import Scan
+from rnps.stream import NdjsonSink
 
 class Validator:
-    def __init__(self) -> None:
-        self.__args = Args()
+    def __init__(self,argv=None) -> None:
+        self.__args = Args(argv)
         self.__errors = []
 
     def validate(self) -> list:
         try:
-            self.host = Host(self.__args.getHost())
+            self.__args.resume()
+            if self.__args.getServicesFile() is not None:
+                PortService.addFile(self.__args.getServicesFile())
+            hosts = Hosts(self.__args.getHosts())
+            for e in hosts.errors:
+                sys.stderr.write("WARNING ! {}\n".format(e))
+            self.host = hosts.host
+            self.addresses = hosts.addresses
             self.port = Port(self.__args.getPorts(),self.__args.getPortType())
-            self.scan = Scan(host=self.host,port=self.port,verbose=self.verbose(),maxThreads=self.__args.getMaxThreads())
+            self.baseline = self.__args.getBaseline()
+            self.metrics = Metrics() if self.__args.getMetricsFile() is not None else None
+            # the same sink for the full sweep, see getSweepScan
+            self.sink = NdjsonSink(self.filename()) if self.ndjson() else None
+            self.scan = self.createScan(self.baseline)
         except Exception as e:
             self.__errors.append(e)
 
         return self.__errors
 
+    def createScan(self,baseline) -> Scan:
+        return Scan(host=self.host,port=self.port,verbose=self.verbose(),maxThreads=self.__args.getMaxThreads(),
+                    engine=self.__args.getEngine(),concurrency=self.__args.getConcurrency(),
+                    processes=self.__args.getProcesses(),
+                    minTimeout=self.__args.getMinTimeout(),maxTimeout=self.__args.getMaxTimeout(),
+                    rate=self.__args.getRate(),burst=self.__args.getBurst(),
+                    discovery=self.__args.isDiscovery(),
+                    addresses=self.addresses,
+                    sink=self.sink,
+                    checkpoint=self.__args.getCheckpoint(),
+                    baseline=baseline,
+                    seed=self.__args.getSeed(),
+                    metrics=self.metrics,
+                    banners=self.__args.getBanners())
+
+    def getSweepScan(self) -> Scan:
+        # a new scan of every target, compared with the same baseline
+        if not self.__args.isFullSweep() or self.scan.baseline.full:
+            return None
+        self.scan = self.createScan(self.baseline.sweep())
+        return self.scan
+
+    def saveMetrics(self):
+        if self.metrics is not None:
+            self.metrics.save(self.__args.getMetricsFile(),self.__args.getMetricsFormat())
+
     def getErrors(self) -> list:
         return self.__errors
 
@@ -51,5 +91,8 @@ class Validator:
     def json(self) -> bool:
         return self.__args.isJSON()
 
+    def ndjson(self) -> bool:
+        return self.__args.isNDJSON()
+
     def filename(self) -> str :
         return self.__args.filename()
\ No newline at end of file